@@ -0,0 +1,68 @@
+"""
+Peak memory of iterating 100k items, with pages released as they are used
+and without. Each run is made in a fresh process, against a fake Reddit
+listing so no network or keys are needed.
+
+    python benchmarks/iter_memory.py
+"""
+
+import resource
+from multiprocessing import get_context
+
+from socialreaper.iterators import Reddit
+
+ITEMS = 100000
+PAGE_SIZE = 100
+
+
+def listing(page=None, **params):
+    page = int(page) if page else 0
+    children = [{'kind': 't3', 'data': {
+        'id': '%x' % (page * PAGE_SIZE + i),
+        'title': 'title %s' % i,
+        'selftext': str(i) * 1500,
+        'preview': {'images': [{'source': {'url': str(i) + 'u' * 200}}
+                               for _ in range(5)]}}}
+        for i in range(PAGE_SIZE)]
+    after = str(page + 1) if (page + 1) * PAGE_SIZE < ITEMS else None
+    return {'kind': 'Listing', 'data': {'after': after,
+                                        'children': children}}
+
+
+def peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(release, select, results):
+    iterator = Reddit.SubredditIter(listing, 'python', select=select)
+    iterator.release_pages = release
+    iterator.track_headings = False
+
+    # A consumer that keeps the last few items, like a batching sink
+    batch = []
+    start = peak_kb()
+    for item in iterator:
+        batch.append(item)
+        if len(batch) == PAGE_SIZE // 2:
+            batch = []
+
+    results.put((iterator.total, peak_kb() - start))
+
+
+def measure(release, select):
+    context = get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run, args=(release, select, results))
+    process.start()
+    total, peak = results.get()
+    process.join()
+    return total, peak
+
+
+if __name__ == '__main__':
+    for select in (None, ['data.id', 'data.title']):
+        for release in (False, True):
+            total, peak = measure(release, select)
+            print("release_pages=%-5s select=%-5s %s items, peak RSS +%s KB "
+                  "per 100k items" % (release, bool(select), total,
+                                      peak * 100000 // max(total, 1)))
@@ -1,11 +1,64 @@
+import threading
 from os import environ
-from time import time, sleep
+from time import time
 
 import requests
 import requests.auth
 from requests_oauthlib import OAuth1
 
+from . import codec
 from .exceptions import *
+from .metrics import default_metrics
+from .quota import shared_ledger
+from .tokens import default_store
+
+
+class Waiter:
+    """
+    Waits that can be cancelled at once from another thread. Each api object
+    has its own, so stopping one crawl leaves the others running. Give api
+    objects the same waiter to stop them together
+    """
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+        # Seconds waited for each reason
+        self.waited = {}
+        self.lock = threading.Lock()
+
+    def wait(self, seconds, reason='wait'):
+        """
+        Wait, unless stopped
+
+        :param seconds: The number of seconds, fractions included
+        :param reason: What the wait is recorded under
+        :return: The seconds waited
+        """
+
+        start = time()
+        if seconds > 0:
+            self.stopped.wait(seconds)
+        waited = time() - start
+
+        with self.lock:
+            self.waited[reason] = self.waited.get(reason, 0) + waited
+
+        if self.stopped.is_set():
+            raise StoppedError("Stopped during a %s wait" % reason)
+        return waited
+
+    def stop(self):
+        """
+        Cancel every wait, now and until reset
+
+        :return: None
+        """
+
+        self.stopped.set()
+
+    def reset(self):
+        self.stopped.clear()
 
 
 class API:
@@ -21,6 +74,25 @@ class API:
                               requests.exceptions.HTTPError)
         self.session = session
 
+        # Minimum number of seconds between the start of requests
+        self.request_rate = 0
+        self.last_request = time()
+        self.rate_lock = threading.Lock()
+
+        # Rates for particular endpoints, used instead of request_rate. Each
+        # is timed apart from the others, so its requests can overlap them
+        self.endpoint_rates = {}
+        self.endpoint_requests = {}
+
+        # Seconds spent decoding responses
+        self.decode_seconds = 0
+
+        # Where requests, waits and decodes are recorded
+        self.metrics = default_metrics
+
+        # Every wait goes through the waiter, so it can be cancelled
+        self.waiter = Waiter()
+
     def __str__(self):
         return pformat(vars(self))
 
@@ -37,16 +109,68 @@ class API:
             if hasattr(e, 'response') and hasattr(e.response, 'text'):
                 self.log_function(e.response.text)
 
-    def _sleep(self, seconds):
+    def _sleep(self, seconds, reason='retry'):
         """
         Sleep between requests, but don't force asynchronous code to wait
 
         :param seconds: The number of seconds to sleep
+        :param reason: What the wait is recorded under
+        :return: None
+        """
+        if self.force_stop:
+            return
+        self.metrics.wait(reason, self.waiter.wait(seconds, reason))
+
+    def stop(self):
+        """
+        Cancel this api object's waits, now and until resume is called
+
+        :return: None
+        """
+        self.waiter.stop()
+
+    def resume(self):
+        self.waiter.reset()
+
+    def _rate_limit(self, endpoint=None):
+        """
+        Wait until the next request is allowed. Safe to call from multiple
+        threads sharing the api object, each is given its own slot
+
+        :param endpoint: The endpoint requested, for endpoints given their
+        own rate in endpoint_rates
         :return: None
         """
-        for _ in range(int(seconds)):
-            if not self.force_stop:
-                sleep(1)
+
+        with self.rate_lock:
+            now = time()
+            if endpoint in self.endpoint_rates:
+                start = max(now, self.endpoint_requests.get(endpoint, 0) +
+                            self.endpoint_rates[endpoint])
+                self.endpoint_requests[endpoint] = start
+            else:
+                start = max(now, self.last_request + self.request_rate)
+                self.last_request = start
+
+        if start > now:
+            self.metrics.wait('rate_limit',
+                              self.waiter.wait(start - now, 'rate_limit'))
+
+    def decode(self, response):
+        """
+        Decode a json response from its raw bytes, with the fastest json
+        library installed
+
+        :param response: The response
+        :return: The decoded object
+        """
+
+        start = time()
+        data = codec.loads(response.content)
+        seconds = time() - start
+        self.decode_seconds += seconds
+        self.metrics.decode(type(self).__name__, seconds)
+        return data
 
     @staticmethod
     def merge_params(parameters, new):
@@ -54,32 +178,54 @@ class API:
             parameters = {**parameters, **new}
         return parameters
 
-    def get(self, *args, **kwargs):
+    def _record(self, endpoint, start, response=None, retry=0, error=None):
+        if response is None:
+            response = getattr(error, 'response', None)
+        self.metrics.request(
+            type(self).__name__, endpoint, time() - start,
+            status=getattr(response, 'status_code', None),
+            size=len(response.content) if response is not None else 0,
+            retry=retry, error=error)
+
+    def get(self, *args, endpoint=None, **kwargs):
 
         """
         An interface for get requests that handles errors more gracefully to
         prevent data loss
+
+        :param endpoint: The name the request is recorded under in the
+        metrics, a route such as 'r/{subreddit}/new.json' rather than a path
+        holding ids, so there are few of them
         """
 
+        if not endpoint:
+            endpoint = 'other'
+
+        start = time()
         try:
             req_func = self.session.get if self.session else requests.get
             req = req_func(*args, **kwargs)
             req.raise_for_status()
+            self._record(endpoint, start, req)
             self.failed_last = False
             return req
 
         except requests.exceptions.RequestException as e:
+            self._record(endpoint, start, error=e)
             self.log_error(e)
             for i in range(1, self.num_retries):
                 sleep_time = self.retry_rate * i
                 self.log_function("Retrying in %s seconds" % sleep_time)
                 self._sleep(sleep_time)
+                start = time()
                 try:
                     req = requests.get(*args, **kwargs)
                     req.raise_for_status()
+                    self._record(endpoint, start, req, retry=i)
                     self.log_function("New request successful")
                     return req
-                except requests.exceptions.RequestException:
+                except requests.exceptions.RequestException as retry_error:
+                    self._record(endpoint, start, retry=i, error=retry_error)
                     self.log_function("New request failed")
 
             # Allows for the api to ignore one potentially bad request
@@ -91,7 +237,15 @@ class API:
 
 
 class Youtube(API):
-    def __init__(self, api_key):
+    # Quota units charged for a request to each endpoint
+    quota_costs = {"search": 100,
+                   "videos": 1,
+                   "channels": 1,
+                   "playlistItems": 1,
+                   "commentThreads": 1,
+                   "comments": 1}
+
+    def __init__(self, api_key, quota=None):
         super().__init__()
 
         self.key = api_key
@@ -99,20 +253,21 @@ class Youtube(API):
         self.request_rate = 5
         self.last_request = time()
 
-    def api_call(self, edge, parameters, return_results=True):
-        req = self.get("%s/%s" % (self.url, edge), params=parameters)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
+        # Record of the quota spent today, shared by clients of the same key.
+        # Only a given QuotaLedger stops requests past its limit
+        self.quota = quota if quota else shared_ledger(api_key)
 
-        self.last_request = time()
+    def api_call(self, edge, parameters, return_results=True):
+        self.quota.spend(self.quota_costs.get(edge, 1), edge)
+        self._rate_limit(edge)
+        req = self.get("%s/%s" % (self.url, edge), params=parameters,
+                       endpoint=edge)
 
         if not req:
             return None
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def search(self, query, count=50, order="relevance", page='',
                result_type="video", channel_id=None, channel_type=None,
@@ -181,10 +336,37 @@ class Youtube(API):
 
         return self.api_call('search', parameters)
 
-    def videos(self, video_id, count=50, page='', **params):
-        parts = ["contentDetails", "id", "liveStreamingDetails",
-                 "localizations", "player", "recordingDetails", "snippet",
-                 "statistics", "status", "topicDetails"]
+    def uploads_playlist(self, channel_id):
+        parameters = {
+            "part": "contentDetails",
+            "id": channel_id,
+            "key": self.key
+        }
+        items = self.api_call('channels', parameters)['items']
+        if items:
+            return items[0]['contentDetails']['relatedPlaylists']['uploads']
+
+    def playlist_items(self, playlist_id, count=50, page='', **params):
+        count = 50 if count > 50 else count
+        parameters = {
+            "part": "snippet,contentDetails",
+            "playlistId": playlist_id,
+            "maxResults": count,
+            "pageToken": page,
+            "key": self.key
+        }
+        parameters = self.merge_params(parameters, params)
+
+        return self.api_call('playlistItems', parameters)
+
+    def videos(self, video_id, count=50, page='', parts=None, **params):
+        if not parts:
+            parts = ["contentDetails", "id", "liveStreamingDetails",
+                     "localizations", "player", "recordingDetails",
+                     "snippet", "statistics", "status", "topicDetails"]
+        if type(video_id) is list:
+            video_id = ",".join(video_id)
+
         parameters = {
             "part": ",".join(parts),
             "id": video_id,
@@ -254,7 +436,7 @@ class Youtube(API):
 
 
 class Reddit(API):
-    def __init__(self, application_id, application_secret):
+    def __init__(self, application_id, application_secret, token_store=None):
         super().__init__()
         self.retry_rate /= 2  # Because it will try reauthorise if failure
 
@@ -265,12 +447,27 @@ class Reddit(API):
         self.request_rate = 5
         self.user_agent = "SocialReaper"
         self.headers = {}
+        self.token = None
         self.token_expiry = 0
         self.requires_reauth = True
 
-        self.auth()
+        # Tokens are shared with other api objects using the same store
+        self.token_store = token_store if token_store else default_store
+
+        # Seconds before expiry that a token is refreshed
+        self.refresh_margin = 60
+
         self.last_request = time()
 
+    def _use_token(self, token, expiry):
+        self.token = token
+        self.headers = {"Authorization": "bearer %s" % token,
+                        "User-Agent": self.user_agent}
+        self.token_expiry = expiry
+
+    def _token_valid(self):
+        return time() < self.token_expiry - self.refresh_margin
+
     def auth(self):
         client_auth = requests.auth.HTTPBasicAuth('%s' % self.application_id,
                                                   '%s' % self.application_secret)
@@ -285,36 +482,56 @@ class Reddit(API):
         except requests.exceptions.RequestException as e:
             raise ApiError(e)
 
-        rj = response.json()
+        rj = self.decode(response)
 
-        self.headers = {"Authorization": "bearer %s" % rj.get('access_token'),
-                        "User-Agent": self.user_agent}
-        self.token_expiry = time() + rj.get('expires_in', 0)
+        self._use_token(rj.get('access_token'),
+                        time() + rj.get('expires_in', 0))
+        if self.token:
+            self.token_store.set(self.application_id, self.token,
+                                 self.token_expiry)
 
-    def api_call(self, edge, parameters, return_results=True):
+    def refresh_token(self, rejected=None):
+        """
+        Use the stored token, or request a new one if it is about to expire.
+        Only one refresh happens at a time for each application
 
-        if time() > self.token_expiry + 30:
-            self.auth()
+        :param rejected: A token the api refused, which must be replaced
+        :return: None
+        """
 
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
+        if not rejected and self._token_valid():
+            return
 
-        self.last_request = time()
+        with self.token_store.lock(self.application_id):
+            # Another thread or process may have already refreshed the token
+            stored = self.token_store.get(self.application_id)
+            if stored and stored[0] != rejected:
+                self._use_token(*stored)
+                if self._token_valid():
+                    return
+
+            self.auth()
+
+    def api_call(self, edge, parameters, return_results=True, route=None):
+        self.refresh_token()
+        self._rate_limit()
 
+        route = route if route else edge
         try:
             req = self.get("%s/%s" % (self.url, edge), params=parameters,
-                           headers=self.headers)
-        except (ApiError, FatalApiError):
-            try:
-                self.auth()
-            except ApiError:
-                pass
+                           headers=self.headers, endpoint=route)
+        except (ApiError, FatalApiError) as e:
+            response = getattr(e.error, 'response', None)
+            if response is not None and response.status_code == 401:
+                try:
+                    self.refresh_token(rejected=self.token)
+                except ApiError:
+                    pass
             req = self.get("%s/%s" % (self.url, edge), params=parameters,
-                           headers=self.headers)
+                           headers=self.headers, endpoint=route)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def search(self, query, count=100, order="new", page='',
                result_type="link", time_period="all", **params):
@@ -338,7 +555,8 @@ class Reddit(API):
                       "after": page}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call('r/%s/%s.json' % (subreddit, category), parameters)
+        return self.api_call('r/%s/%s.json' % (subreddit, category), parameters,
+                             route='r/{subreddit}/%s.json' % category)
 
     def user(self, user, count=100, order="new", page='',
              result_type="overview", time_period='all', **params):
@@ -352,7 +570,8 @@ class Reddit(API):
         parameters = self.merge_params(parameters, params)
 
         return self.api_call('user/%s/%s.json' % (user, result_type),
-                             parameters)
+                             parameters,
+                             route='user/{user}/%s.json' % result_type)
 
     def thread_comments(self, thread, subreddit, order="top", sub_thread=None,
                         **params):
@@ -366,10 +585,12 @@ class Reddit(API):
         if sub_thread:
             path = 'r/%s/comments/%s/_/%s.json' % (
             subreddit, thread, sub_thread)
+            route = 'r/{subreddit}/comments/{thread}/_/{comment}.json'
         else:
             path = 'r/%s/comments/%s.json' % (subreddit, thread)
+            route = 'r/{subreddit}/comments/{thread}.json'
 
-        return self.api_call(path, parameters)
+        return self.api_call(path, parameters, route=route)
 
     def more_children(self, children, link_id, sort="new",
                       **params):
@@ -383,6 +604,12 @@ class Reddit(API):
 
         return self.api_call('api/morechildren', parameters)
 
+    def info(self, fullnames, **params):
+        parameters = {"id": ",".join(fullnames)}
+        parameters = self.merge_params(parameters, params)
+
+        return self.api_call('api/info', parameters)
+
 
 class Facebook(API):
     def __init__(self, api_key):
@@ -394,18 +621,13 @@ class Facebook(API):
         self.request_rate = 1
         self.last_request = time()
 
-    def api_call(self, edge, parameters, return_results=True):
+    def api_call(self, edge, parameters, return_results=True, route=None):
+        self._rate_limit()
         req = self.get("%s%s/%s" % (self.url, self.version, edge),
-                       params=parameters)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
-
-        self.last_request = time()
+                       params=parameters, endpoint=route if route else edge)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def node_edge(self, node, edge, fields=None, params=None):
 
@@ -424,7 +646,8 @@ class Facebook(API):
                       "access_token": self.key}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call('%s/%s' % (node, edge), parameters)
+        return self.api_call('%s/%s' % (node, edge), parameters,
+                             route='{node}/%s' % edge)
 
     def post(self, post_id, fields=None, **params):
 
@@ -442,7 +665,7 @@ class Facebook(API):
                       "access_token": self.key}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call('%s' % post_id, parameters)
+        return self.api_call('%s' % post_id, parameters, route='{post}')
 
     def page_posts(self, page_id, after='', post_type="posts",
                    include_hidden=False, fields=None, **params):
@@ -466,7 +689,8 @@ class Facebook(API):
                       "include_hidden": include_hidden}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call('%s/%s' % (page_id, post_type), parameters)
+        return self.api_call('%s/%s' % (page_id, post_type), parameters,
+                             route='{page}/%s' % post_type)
 
     def post_comments(self, post_id, after='', order="chronological",
                       filter="stream", fields=None, **params):
@@ -495,7 +719,8 @@ class Facebook(API):
                       "filter": filter}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call('%s/comments' % post_id, parameters)
+        return self.api_call('%s/comments' % post_id, parameters,
+                             route='{post}/comments')
 
 
 class Tumblr(API):
@@ -508,18 +733,14 @@ class Tumblr(API):
         self.request_rate = 2
         self.last_request = time()
 
-    def api_call(self, edge, parameters, return_results=True):
+    def api_call(self, edge, parameters, return_results=True, route=None):
+        self._rate_limit()
         parameters['api_key'] = self.api_key
-        req = self.get("%s/%s" % (self.url, edge), params=parameters)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
-
-        self.last_request = time()
+        req = self.get("%s/%s" % (self.url, edge), params=parameters,
+                       endpoint=route if route else edge)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def blog(self, blog, limit=20, offset=0, **params):
         parameters = {
@@ -528,7 +749,8 @@ class Tumblr(API):
         }
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call("blog/%s/info" % blog, parameters)
+        return self.api_call("blog/%s/info" % blog, parameters,
+                             route="blog/{blog}/info")
 
     def blog_posts(self, blog, type="text", limit=20, offset=0, filter="text",
                    notes_info=True, reblog_info=True,
@@ -542,7 +764,8 @@ class Tumblr(API):
         }
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call("blog/%s/posts/%s" % (blog, type), parameters)
+        return self.api_call("blog/%s/posts/%s" % (blog, type), parameters,
+                             route="blog/{blog}/posts/%s" % type)
 
     def tag(self, tag, limit=20, before=None, filter=None, **params):
         parameters = {
@@ -573,17 +796,12 @@ class Twitter(API):
         self.last_request = time()
 
     def api_call(self, edge, parameters, return_results=True):
+        self._rate_limit()
         req = self.get("%s/%s" % (self.url, edge), params=parameters,
-                       auth=self.auth)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
-
-        self.last_request = time()
+                       auth=self.auth, endpoint=edge)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def search(self, query, count=100, max_id='',
                result_type="mixed", include_entities=True,
@@ -623,51 +841,53 @@ class Pinterest(API):
 
         self.last_request = time()
 
-    def api_call(self, edge, parameters, return_results=True):
+    def api_call(self, edge, parameters, return_results=True, route=None):
+        route = route if route else edge
+        self._rate_limit(route)
         parameters['access_token'] = self.access_token
-        req = self.get(f"{self.url}/{edge}", params=parameters)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
-
-        self.last_request = time()
+        req = self.get(f"{self.url}/{edge}", params=parameters,
+                       endpoint=route)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
-    def read_edge(self, edge, fields, **params):
+    def read_edge(self, edge, fields, route='edge', **params):
+        """
+        Read an edge, eg. 'me/pins/'
+
+        :param edge: The path of the edge
+        :param fields: The fields to get
+        :param route: The edge with its ids left out, eg. '{user}/pins/', as
+        requests are recorded in the metrics
+        :return: The response
+        """
         parameters = {"fields": ",".join(fields) if fields else None}
         parameters = self.merge_params(parameters, params)
 
-        return self.api_call(edge, parameters)
+        return self.api_call(edge, parameters, route=route)
 
 
 class Twitch(API):
-    def __init__(self, client_id):
+    def __init__(self, client_id, access_token=None):
         super().__init__()
 
         self.client_id = client_id
         self.url = "https://api.twitch.tv/helix"
         self.request_rate = 5
 
+        self.headers = {'Client-ID': self.client_id}
+        if access_token:
+            self.headers['Authorization'] = "Bearer %s" % access_token
+
         self.last_request = time()
 
     def api_call(self, edge, parameters, return_results=True):
-        headers = {
-            'Client-ID': self.client_id
-        }
+        self._rate_limit()
         req = self.get(f"{self.url}/{edge}", params=parameters,
-                       headers=headers)
-
-        time_diff = time() - self.last_request
-        if time_diff < self.request_rate:
-            sleep(self.request_rate - time_diff)
-
-        self.last_request = time()
+                       headers=self.headers, endpoint=edge)
 
         if return_results:
-            return req.json()
+            return self.decode(req)
 
     def videos(self, id=None, user_id=None, game_id=None, after=None,
                before=None, first=100, period='all', sort='time',
@@ -688,5 +908,48 @@ class Twitch(API):
         parameters = self.merge_params(parameters, kwargs)
         return self.api_call('videos', parameters=parameters)
 
+    def clips(self, broadcaster_id=None, game_id=None, id=None, after=None,
+              before=None, first=100, started_at=None, ended_at=None,
+              **kwargs):
+
+        parameters = {
+            'broadcaster_id': broadcaster_id,
+            'game_id': game_id,
+            'id': id,
+            'after': after,
+            'before': before,
+            'first': first,
+            'started_at': started_at,
+            'ended_at': ended_at
+        }
+
+        parameters = self.merge_params(parameters, kwargs)
+        return self.api_call('clips', parameters=parameters)
+
+    def streams(self, user_id=None, user_login=None, game_id=None,
+                language=None, after=None, before=None, first=100, **kwargs):
+
+        parameters = {
+            'user_id': user_id,
+            'user_login': user_login,
+            'game_id': game_id,
+            'language': language,
+            'after': after,
+            'before': before,
+            'first': first
+        }
+
+        parameters = self.merge_params(parameters, kwargs)
+        return self.api_call('streams', parameters=parameters)
+
+    def users(self, login=None, id=None, **kwargs):
+        parameters = {
+            'login': login,
+            'id': id
+        }
+
+        parameters = self.merge_params(parameters, kwargs)
+        return self.api_call('users', parameters=parameters)
+
     def user_id(self, username):
         return self.api_call('users', parameters={'login': username})
@@ -0,0 +1,100 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """
+    Encodes and decodes json with the standard library
+    """
+
+    name = 'json'
+
+    def loads(self, data):
+        """
+        Decode json
+
+        :param data: The json, as bytes or a string
+        :return: The object
+        """
+        return json.loads(data)
+
+    def dumps(self, obj, indent=None):
+        """
+        Encode an object as json
+
+        :param obj: The object
+        :param indent: The indentation, None for a single line
+        :return: The json string
+        """
+        return json.dumps(obj, indent=indent, ensure_ascii=False)
+
+
+class OrjsonCodec(JsonCodec):
+    name = 'orjson'
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+    def dumps(self, obj, indent=None):
+        # orjson can only indent by two spaces
+        if indent not in (None, 2):
+            return super().dumps(obj, indent)
+
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode('utf-8')
+
+
+class UjsonCodec(JsonCodec):
+    name = 'ujson'
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+    def dumps(self, obj, indent=None):
+        return ujson.dumps(obj, indent=indent if indent else 0,
+                           ensure_ascii=False)
+
+
+codecs = {'json': JsonCodec}
+if ujson:
+    codecs['ujson'] = UjsonCodec
+if orjson:
+    codecs['orjson'] = OrjsonCodec
+
+# The codec used throughout, the fastest one installed
+codec = codecs.get('orjson', codecs.get('ujson', JsonCodec))()
+
+
+def set_codec(name):
+    """
+    Choose the json library used throughout
+
+    :param name: 'orjson', 'ujson' or 'json'
+    :return: The codec
+    """
+
+    global codec
+    if name not in codecs:
+        raise ValueError("%s is not installed, choose from %s" % (
+            name, ", ".join(codecs)))
+    codec = codecs[name]()
+    return codec
+
+
+def loads(data):
+    return codec.loads(data)
+
+
+def dumps(obj, indent=None):
+    return codec.dumps(obj, indent)
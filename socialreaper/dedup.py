@@ -0,0 +1,318 @@
+import sqlite3
+from hashlib import blake2b
+from math import ceil, exp, log
+from os import path, replace
+
+from . import codec
+from .tools import get_path
+
+
+class BloomFilter:
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        """
+        A set that uses a fixed amount of memory, at the cost of sometimes
+        reporting a key it hasn't seen
+
+        :param capacity: The number of keys it is sized for
+        :param error_rate: The chance of a false positive at capacity
+        """
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        # Bits and hashes for the capacity and error rate
+        self.size = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(ceil(self.size / 8))
+        self.count = 0
+
+    def _positions(self, key):
+        digest = blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def false_positive_rate(self):
+        """
+        Estimate the chance of a false positive with the keys added so far
+
+        :return: The chance
+        """
+
+        return (1 - exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def header(self):
+        return {'type': 'bloom', 'capacity': self.capacity,
+                'error_rate': self.error_rate, 'count': self.count}
+
+    @classmethod
+    def from_header(cls, header, bits):
+        bloom = cls(header['capacity'], header['error_rate'])
+        bloom.bits = bytearray(bits)
+        bloom.count = header['count']
+        return bloom
+
+
+class SQLiteSet:
+    def __init__(self, file_name='seen.db'):
+        """
+        An exact set kept in an SQLite database, so its size is limited by
+        disk rather than memory
+
+        :param file_name: The database file
+        """
+
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY)")
+
+    def __contains__(self, key):
+        return self.connection.execute(
+            "SELECT 1 FROM seen WHERE key = ?", (str(key),)).fetchone() \
+            is not None
+
+    def add(self, key):
+        self.connection.execute(
+            "INSERT OR IGNORE INTO seen (key) VALUES (?)", (str(key),))
+
+    def update(self, keys):
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO seen (key) VALUES (?)",
+            ((str(key),) for key in keys))
+
+    def __iter__(self):
+        return (row[0] for row in
+                self.connection.execute("SELECT key FROM seen"))
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def save(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class Deduplicator:
+    def __init__(self, key='id', threshold=100000, error_rate=0.001,
+                 capacity=None, file_name=None, overflow='bloom',
+                 namespace=''):
+        """
+        Drop items whose id has been seen before. Ids are kept in an exact
+        set until there are threshold of them, then in a Bloom filter, or in
+        an SQLite set for exact de-duplication. Given a file, the ids are
+        kept between runs
+
+        :param key: The flattened key of each item's id, or a function that
+        gets it. Items without an id are always kept
+        :param threshold: The number of ids kept in the exact set
+        :param error_rate: The Bloom filter's chance of dropping a new item.
+        A full filter is followed by one with half its error rate, so the
+        overall chance stays under twice this
+        :param capacity: The ids each Bloom filter is sized for, defaults to
+        ten times the threshold
+        :param file_name: Where the ids are kept between runs
+        :param overflow: 'bloom', or 'sqlite' to keep every id in the file
+        :param namespace: A prefix for the ids, eg. the platform, so that
+        crawls of different platforms can share a file
+        """
+
+        if overflow == 'sqlite' and not file_name:
+            raise ValueError("An sqlite overflow needs a file_name")
+
+        self.key = key
+        self.threshold = threshold
+        self.error_rate = error_rate
+        self.capacity = capacity if capacity else threshold * 10
+        self.file_name = file_name
+        self.overflow = overflow
+        self.namespace = namespace
+
+        # The exact set, replaced by the overflow store past the threshold
+        self.seen = set()
+
+        # Bloom filters filled to capacity, still checked but not added to
+        self.full = []
+
+        # Items checked, dropped, and kept for having no id
+        self.checked = 0
+        self.dropped = 0
+        self.missing = 0
+
+        if file_name and path.isfile(file_name):
+            self.load()
+            if isinstance(self.seen, set) and len(self.seen) > threshold:
+                self._grow()
+
+    def _id(self, item):
+        value = self.key(item) if callable(self.key) \
+            else get_path(item, self.key)
+        if value is None:
+            return None
+        return "%s%s" % (self.namespace, value)
+
+    def _grow(self):
+        if self.overflow == 'sqlite':
+            store = SQLiteSet(self.file_name)
+            store.update(self.seen)
+        else:
+            store = BloomFilter(self.capacity, self.error_rate)
+            for item_id in self.seen:
+                store.add(item_id)
+        self.seen = store
+
+    def _roll(self):
+        """
+        Start a new Bloom filter once the current one is at capacity, with
+        half its error rate, so the overall error rate stays bounded
+
+        :return: None
+        """
+
+        self.full.append(self.seen)
+        self.seen = BloomFilter(self.capacity, self.seen.error_rate / 2)
+
+    def __contains__(self, item_id):
+        return item_id in self.seen or \
+            any(item_id in bloom for bloom in self.full)
+
+    def check(self, item):
+        """
+        Check an item, remembering its id
+
+        :param item: The item
+        :return: True if the item is new, or has no id
+        """
+
+        item_id = self._id(item)
+        self.checked += 1
+
+        if item_id is None:
+            self.missing += 1
+            return True
+
+        if item_id in self:
+            self.dropped += 1
+            return False
+
+        self.seen.add(item_id)
+        if isinstance(self.seen, set):
+            if len(self.seen) > self.threshold:
+                self._grow()
+        elif isinstance(self.seen, BloomFilter):
+            if self.seen.count >= self.seen.capacity:
+                self._roll()
+        return True
+
+    __call__ = check
+
+    def filter(self, items):
+        """
+        Drop the items that have been seen
+
+        :param items: An iterable of items
+        :return: A generator of the new items
+        """
+
+        for item in items:
+            if self.check(item):
+                yield item
+
+    def filter_batch(self, batch):
+        return [item for item in batch if self.check(item)]
+
+    def load(self):
+        if self.overflow == 'sqlite':
+            # Small stores are read back into the exact set
+            store = SQLiteSet(self.file_name)
+            if len(store) > self.threshold:
+                self.seen = store
+            else:
+                self.seen = set(store)
+                store.close()
+            return
+
+        with open(self.file_name, 'rb') as f:
+            header = codec.loads(f.readline())
+            body = f.read()
+
+        if header['type'] == 'bloom':
+            blooms = []
+            for bloom_header in header.get('filters', [header]):
+                length = ceil(BloomFilter(bloom_header['capacity'],
+                                          bloom_header['error_rate']).size / 8)
+                blooms.append(BloomFilter.from_header(bloom_header,
+                                                      body[:length]))
+                body = body[length:]
+            self.full = blooms[:-1]
+            self.seen = blooms[-1]
+        else:
+            self.seen = set(codec.loads(body))
+
+    def save(self):
+        """
+        Write the ids to the file, to be skipped in later runs
+
+        :return: None
+        """
+
+        if isinstance(self.seen, SQLiteSet):
+            self.seen.save()
+            return
+        if not self.file_name:
+            return
+
+        if self.overflow == 'sqlite':
+            store = SQLiteSet(self.file_name)
+            store.update(self.seen)
+            store.close()
+            return
+
+        temp_name = self.file_name + '.tmp'
+        with open(temp_name, 'wb') as f:
+            if isinstance(self.seen, BloomFilter):
+                blooms = self.full + [self.seen]
+                f.write(codec.dumps({'type': 'bloom', 'filters': [
+                    bloom.header() for bloom in blooms]}).encode('utf-8'))
+                f.write(b'\n')
+                for bloom in blooms:
+                    f.write(bloom.bits)
+            else:
+                f.write(codec.dumps({'type': 'set'}).encode('utf-8'))
+                f.write(b'\n')
+                f.write(codec.dumps(list(self.seen)).encode('utf-8'))
+        replace(temp_name, self.file_name)
+
+    def close(self):
+        self.save()
+        if isinstance(self.seen, SQLiteSet):
+            self.seen.close()
+
+    def stats(self):
+        stats = {'checked': self.checked, 'dropped': self.dropped,
+                 'missing': self.missing,
+                 'ids': len(self.seen) + sum(len(bloom) for bloom in self.full),
+                 'store': type(self.seen).__name__}
+        if isinstance(self.seen, BloomFilter):
+            kept = 1
+            for bloom in self.full + [self.seen]:
+                kept *= 1 - bloom.false_positive_rate()
+            stats['false_positive_rate'] = 1 - kept
+            stats['filters'] = len(self.full) + 1
+        return stats
@@ -0,0 +1,292 @@
+import sqlite3
+from hashlib import sha1
+from multiprocessing import Process
+from os import getpid
+from socket import gethostname
+from time import time, sleep
+
+from . import codec
+from .tools import flatten, send
+
+
+class WorkQueue:
+    """
+    A queue of crawl tasks shared between worker processes. Tasks are leased
+    to one worker at a time, and go back to the queue if their lease runs out
+    before they are completed
+    """
+
+    def put(self, key, payload):
+        """
+        Add a task, unless a task with the same key has been added before
+
+        :param key: The unique key of the task
+        :param payload: A json serialisable description of the task
+        :return: True if the task was added
+        """
+        raise NotImplementedError
+
+    def claim(self, worker, lease):
+        """
+        Lease the next available task
+
+        :param worker: The id of the worker
+        :param lease: The number of seconds the task is leased for
+        :return: A tuple of the task id, key and payload, or None
+        """
+        raise NotImplementedError
+
+    def renew(self, task_id, worker, lease):
+        """
+        Extend the lease of a task
+
+        :return: False if the worker no longer holds the lease
+        """
+        raise NotImplementedError
+
+    def complete(self, task_id, worker):
+        raise NotImplementedError
+
+    def fail(self, task_id, worker, error, max_attempts):
+        raise NotImplementedError
+
+    def counts(self):
+        """
+        Get the number of tasks in each state
+
+        :return: A dictionary of state and count
+        """
+        raise NotImplementedError
+
+
+class SQLiteQueue(WorkQueue):
+    def __init__(self, file_name='queue.db', timeout=30):
+        """
+        A work queue kept in an SQLite database file, so it can be shared by
+        processes on the same machine or on a shared disk
+
+        :param file_name: The database file
+        :param timeout: Seconds to wait for another process' lock
+        """
+
+        self.file_name = file_name
+        self.connection = sqlite3.connect(file_name, timeout=timeout,
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY, key TEXT UNIQUE, payload TEXT, "
+            "status TEXT, worker TEXT, lease_until REAL, "
+            "attempts INTEGER DEFAULT 0, error TEXT)")
+
+    def put(self, key, payload):
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO tasks (key, payload, status) "
+            "VALUES (?, ?, 'pending')", (key, codec.dumps(payload)))
+        return cursor.rowcount == 1
+
+    def claim(self, worker, lease):
+        now = time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT id, key, payload FROM tasks WHERE status = 'pending' "
+                "OR (status = 'claimed' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row:
+                self.connection.execute(
+                    "UPDATE tasks SET status = 'claimed', worker = ?, "
+                    "lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + lease, row[0]))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        if row:
+            return row[0], row[1], codec.loads(row[2])
+
+    def renew(self, task_id, worker, lease):
+        cursor = self.connection.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? "
+            "AND status = 'claimed'", (time() + lease, task_id, worker))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker):
+        self.connection.execute(
+            "UPDATE tasks SET status = 'done', lease_until = NULL "
+            "WHERE id = ? AND status != 'done'", (task_id,))
+
+    def fail(self, task_id, worker, error, max_attempts):
+        self.connection.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? "
+            "THEN 'failed' ELSE 'pending' END, error = ?, lease_until = NULL "
+            "WHERE id = ? AND worker = ?",
+            (max_attempts, str(error), task_id, worker))
+
+    def counts(self):
+        rows = self.connection.execute(
+            "SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+
+def _method_name(function):
+    # Generated Facebook methods all share the function name 'method'
+    for name in dir(type(function.__self__)):
+        if getattr(type(function.__self__), name, None) is function.__func__:
+            return name
+    return function.__name__
+
+
+def task_key(method, key, kwargs):
+    """
+    Make the unique key of a task. Tasks for the same key with different
+    arguments, eg. other fields or count, are different tasks
+
+    :param method: The name of the source's method
+    :param key: The outer key the method is called with
+    :param kwargs: The method's keyword arguments
+    :return: The task key
+    """
+
+    if not kwargs:
+        return "%s:%s" % (method, key)
+    digest = sha1(codec.dumps(sorted(kwargs.items())).encode('utf-8'))
+    return "%s:%s:%s" % (method, key, digest.hexdigest()[:16])
+
+
+def publish(iter_iter, queue):
+    """
+    Publish the outer keys of a nested crawl, eg. Reddit.subreddit_thread_
+    comments or a generated Facebook method, as tasks for workers
+
+    :param iter_iter: The IterIter of the crawl
+    :param queue: The WorkQueue
+    :return: The number of new tasks
+    """
+
+    method = _method_name(iter_iter.inner_func)
+    published = 0
+
+    for item in iter_iter.outer:
+        item = flatten(item)
+        key = item.get(iter_iter.key)
+        if key is None:
+            continue
+
+        kwargs = iter_iter.item_kwargs(item)
+        payload = {'method': method, 'args': [key], 'kwargs': kwargs,
+                   'include_parents': iter_iter.include_parents}
+        if queue.put(task_key(method, key, kwargs), payload):
+            published += 1
+
+    return published
+
+
+class Worker:
+    def __init__(self, queue, source, sinks=None, lease=300, max_attempts=3,
+                 worker_id=None):
+        """
+        Claim tasks from a work queue and run them. Each task is delivered at
+        least once: if a worker stops before completing a task, it is run
+        again once its lease runs out
+
+        :param queue: The WorkQueue
+        :param source: The source the tasks' methods are called on
+        :param sinks: Where items are sent
+        :param lease: Seconds a task is leased for, renewed while it runs
+        :param max_attempts: Times a task is tried before it is failed
+        :param worker_id: The id of the worker
+        """
+
+        self.queue = queue
+        self.source = source
+        self.sinks = sinks if sinks else []
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id if worker_id else "%s-%s" % (
+            gethostname(), getpid())
+
+        self.completed = 0
+        self.failed = 0
+
+    def run_task(self, task_id, payload):
+        iterator = getattr(self.source, payload['method'])(
+            *payload['args'], **payload['kwargs'])
+        renewed = time()
+
+        for item in iterator:
+            if payload.get('include_parents'):
+                item['parent_id'] = payload['args'][0]
+            for sink in self.sinks:
+                send(sink, item)
+
+            if time() - renewed > self.lease / 2:
+                self.queue.renew(task_id, self.worker_id, self.lease)
+                renewed = time()
+
+    def run(self, max_tasks=None, wait=0):
+        """
+        Run tasks until the queue is empty
+
+        :param max_tasks: Stop after this many tasks
+        :param wait: Seconds to keep polling an empty queue, for tasks
+        still being published or leased by other workers
+        :return: The number of tasks completed
+        """
+
+        idle_since = time()
+        while not max_tasks or self.completed + self.failed < max_tasks:
+            task = self.queue.claim(self.worker_id, self.lease)
+            if not task:
+                if time() - idle_since >= wait:
+                    break
+                sleep(1)
+                continue
+
+            task_id, key, payload = task
+            try:
+                self.run_task(task_id, payload)
+                self.queue.complete(task_id, self.worker_id)
+                self.completed += 1
+            except Exception as e:
+                self.queue.fail(task_id, self.worker_id, e, self.max_attempts)
+                self.failed += 1
+            idle_since = time()
+
+        for sink in self.sinks:
+            if hasattr(sink, 'flush'):
+                sink.flush()
+
+        return self.completed
+
+
+def _work(queue_file, source_factory, sinks_factory, wait, kwargs):
+    sinks = sinks_factory() if sinks_factory else []
+    worker = Worker(SQLiteQueue(queue_file), source_factory(), sinks, **kwargs)
+    worker.run(wait=wait)
+
+
+def run_workers(queue_file, source_factory, processes=4, sinks_factory=None,
+                wait=0, **kwargs):
+    """
+    Run worker processes on an SQLite work queue
+
+    :param queue_file: The queue's database file
+    :param source_factory: A picklable function that creates the source in
+    each process
+    :param sinks_factory: A picklable function that creates each process'
+    sinks
+    :param processes: The number of processes
+    :param wait: Seconds each worker polls an empty queue
+    :param kwargs: Worker options
+    :return: None
+    """
+
+    workers = [Process(target=_work, args=(queue_file, source_factory,
+                                           sinks_factory, wait, kwargs))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
@@ -18,3 +18,24 @@ class ApiError(Exception):
 
 class FatalApiError(ApiError):
     """The fatal failure of the api to fulfill a request"""
+
+
+class QuotaExceededError(FatalApiError):
+    """A request that would spend more quota than remains for the day"""
+
+    def __str__(self):
+        return str(self.error)
+
+
+class NoCredentialsError(FatalApiError):
+    """Every key in a credential pool is quarantined"""
+
+    def __str__(self):
+        return str(self.error)
+
+
+class StoppedError(FatalApiError):
+    """A wait cancelled because the crawl was stopped"""
+
+    def __str__(self):
+        return str(self.error)
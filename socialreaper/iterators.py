@@ -1,18 +1,125 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import islice
 from pprint import pformat
+from queue import Empty, Full, Queue
+from time import time
 from urllib.parse import parse_qs, urlparse
 
 from .apis import Facebook as FacebookApi, Twitter as TwitterApi, \
     Reddit as RedditApi, Youtube as YoutubeApi, Tumblr as TumblrApi, \
-    Pinterest as PinterestAPI
+    Pinterest as PinterestAPI, Twitch as TwitchApi
 from .builders.build import Shell
 from .exceptions import ApiError
-from .tools import flatten
+from .metrics import default_metrics
+from .pipeline import Pipeline
+from .pool import CredentialPool, PooledApi
+from .profiler import profile
+from .tools import flatten, get_path
+from .transform import ProcessTransform
+
+# Milliseconds between the unix epoch and the epoch of tweet ids
+TWITTER_EPOCH = 1288834974657
+
+
+def _key_names(key):
+    # The names in a flattened key, up to the first list index
+    names = []
+    for name in key.split('.'):
+        if name.isdigit():
+            break
+        names.append(name)
+    return names
+
+
+def select_roots(select):
+    """
+    Get the top level fields of selected keys, for apis that take a list of
+    fields, eg. ['id', 'counts'] for ['id', 'counts.pins']
+
+    :param select: The flattened keys
+    :return: A list of field names
+    """
+    roots = []
+    for key in select:
+        if key.split('.')[0] not in roots:
+            roots.append(key.split('.')[0])
+    return roots
+
+
+def graph_fields(select):
+    """
+    Turn selected keys into Graph api fields, eg. ['id', 'from{name}'] for
+    ['id', 'from.name']
+
+    :param select: The flattened keys
+    :return: A list of fields
+    """
+    tree = OrderedDict()
+    for key in select:
+        names = _key_names(key)
+        # Connections are wrapped in a data list
+        if len(names) > 1 and names[-1] == 'data':
+            names.pop()
+        node = tree
+        for name in names:
+            node = node.setdefault(name, OrderedDict())
+
+    def fields(node):
+        return [name + ('{%s}' % ','.join(fields(child)) if child else '')
+                for name, child in node.items()]
+
+    return fields(tree)
+
+
+def youtube_fields(select, required=()):
+    """
+    Turn selected keys into a YouTube fields filter, keeping the paging token
+
+    :param select: The flattened keys of each item
+    :param required: Keys the iterator reads itself, kept whether selected
+    or not
+    :return: The fields parameter
+    """
+    paths = []
+    for key in list(required) + list(select):
+        path = '/'.join(_key_names(key))
+        if path and path not in paths:
+            paths.append(path)
+    return 'nextPageToken,items(%s)' % ','.join(paths)
 
 
 class IterError(Exception):
     def __init__(self, e, variables):
         self.error = e
-        self.vars = variables
+        self.vars = self.snapshot(variables)
+
+    @staticmethod
+    def snapshot(variables):
+        """
+        Keep the small values of an iterator's state, such as its paging
+        parameters, rather than pinning its pages in the error
+
+        :param variables: The iterator's variables
+        :return: A dictionary of the small values
+        """
+
+        def small(value):
+            return value is None or isinstance(value, (str, int, float))
+
+        snapshot = {}
+        for key, value in variables.items():
+            if small(value):
+                snapshot[key] = value
+            elif isinstance(value, (dict, list, tuple)) and len(value) <= 100:
+                values = value.values() if isinstance(value, dict) else value
+                if all(small(v) or isinstance(v, (list, tuple)) and
+                       all(small(i) for i in v) for v in values):
+                    snapshot[key] = type(value)(value)
+        return snapshot
 
     def __str__(self):
         return str(self.error)
@@ -44,6 +151,35 @@ class Iter:
         # The set of all headings used in the dataset
         self.headings = set()
 
+        # Collect the headings of each page, can be turned off for speed
+        self.track_headings = True
+
+        # Flattened keys each item is trimmed to, None to keep whole items
+        self.select = None
+
+        # Where pages are recorded, the time of the first page, and the
+        # seconds spent getting pages
+        self.metrics = default_metrics
+        self.started = None
+        self.fetch_seconds = 0
+
+        # Drop each page's items from the response, and each item from the
+        # page once it has been returned
+        self.release_pages = True
+
+    def _pop_options(self, kwargs):
+        """
+        Take the options every iterator accepts out of its keyword arguments,
+        leaving the rest to be sent as request parameters
+
+        :param kwargs: The iterator's keyword arguments
+        :return: None
+        """
+
+        if kwargs.get('count'):
+            self.max = int(kwargs.pop('count'))
+        self.select = kwargs.pop('select', None)
+
     def __iter__(self):
         return self
 
@@ -51,6 +187,8 @@ class Iter:
         # If not at the end of data, return the next element, else get more
         if self.i < len(self.data):
             result = self.data[self.i]
+            if self.release_pages:
+                self.data[self.i] = None
             self.i += 1
             self.total += 1
 
@@ -62,9 +200,12 @@ class Iter:
 
         else:
             try:
-                self.get_data()
-                for item in self.data:
-                    self.headings.update(item.keys())
+                self.get_page()
+                if self.select:
+                    self.data = [self.project(item) for item in self.data]
+                if self.track_headings:
+                    for item in self.data:
+                        self.headings.update(item.keys())
 
             except StopIteration:
                 raise StopIteration
@@ -90,11 +231,131 @@ class Iter:
         """
         pass
 
+    def get_page(self):
+        """
+        Get the next page of data, recording it in the metrics
+        :return: None
+        """
+        start = time()
+        if not self.started:
+            self.started = start
+
+        self.get_data()
+        if self.release_pages:
+            self.release_response()
+
+        seconds = time() - start
+        self.fetch_seconds += seconds
+        items = len(self.data) if hasattr(self.data, '__len__') else 0
+        self.metrics.page(type(self).__name__, items, seconds)
+
+    def release_response(self):
+        """
+        Remove the page's items from the raw response once the paging state
+        has been read, so that only self.data holds them
+        :return: None
+        """
+        def strip(node, depth):
+            items = node.items() if isinstance(node, dict) else enumerate(node)
+            for key, value in list(items):
+                if value is self.data:
+                    node[key] = []
+                elif isinstance(value, dict) and depth < 3:
+                    strip(value, depth + 1)
+
+        if isinstance(self.response, (dict, list)) and \
+                self.response is not self.data:
+            strip(self.response, 0)
+
+    def stats(self):
+        """
+        Get the progress of the iterator
+
+        :return: A dictionary of pages, items and rates
+        """
+        elapsed = time() - self.started if self.started else 0
+        return {'iterator': type(self).__name__,
+                'pages': self.page_count,
+                'items': self.total,
+                'fetch_seconds': self.fetch_seconds,
+                'seconds': elapsed,
+                'items_per_second': self.total / elapsed if elapsed else 0}
+
     def get_headings(self):
         return self.headings
 
+    def project(self, item):
+        """
+        Trim an item to the selected keys
+
+        :param item: The item
+        :return: A flat dictionary of the selected keys
+        """
+
+        return {key: get_path(item, key) for key in self.select}
+
+    def transform(self, *functions, **kwargs):
+        """
+        Apply functions to the items in a pool of processes, while the next
+        pages are fetched
+
+        :param functions: Picklable functions, eg. tools.flatten
+        :param kwargs: processes, batch_size and prefetch options
+        :return: A ProcessTransform
+        """
+
+        return ProcessTransform(self, *functions, **kwargs)
+
+    def pipeline(self, **kwargs):
+        """
+        Stream the items through stages into sinks, eg.
+        source.subreddit('python').pipeline().flatten().to(JSONLSink()).run()
+
+        :param kwargs: batch_size and queue_size options
+        :return: A Pipeline
+        """
+
+        return Pipeline(self, **kwargs)
+
+    def profile(self, *sinks, **kwargs):
+        """
+        Consume the items into sinks, sampling where the time goes
+
+        :param sinks: Where items are sent
+        :param kwargs: interval and collapsed_file options
+        :return: The Profiler, see its report and summary methods
+        """
+
+        return profile(self, *sinks, **kwargs)
+
 
 class Source:
+    def add_credentials(self, *credentials, **kwargs):
+        """
+        Spread requests over more keys. Keys that are refused or run out of
+        quota are quarantined, and their health is kept in the pool
+
+        :param credentials: The keys, or tuples of the arguments used to
+        create this source, eg. (api_key, api_secret, access_token,
+        access_token_secret) for Twitter
+        :param kwargs: strategy and quarantine options for a new pool
+        :return: The credential pool
+        """
+
+        if isinstance(self.api, PooledApi):
+            pool = self.api.pool
+        else:
+            pool = CredentialPool([self.api], **kwargs)
+
+        api_class = type(pool.apis[0])
+        for credential in credentials:
+            if not isinstance(credential, tuple):
+                credential = (credential,)
+            pool.add(api_class(*credential))
+
+        self.api = PooledApi(pool)
+        return pool
+
     @staticmethod
     def merge(args, fields):
         if not args:
@@ -123,7 +384,7 @@ def merge(args, fields):
 
 
 class IterIter:
-    def __init__(self, outer, key, inner_func, inner_args):
+    def __init__(self, outer, key, inner_func, inner_args, item_args=None):
         # Outer iter to obtain keys from
         self.outer = outer
 
@@ -142,6 +403,10 @@ class IterIter:
         # The inner function's arguments
         self.inner_args = inner_args
 
+        # Keyword arguments of the inner function taken from each outer
+        # item, by flattened key, eg. {'subreddit': 'data.subreddit'}
+        self.item_args = item_args if item_args else {}
+
         self.include_parents = False
         if inner_args.get('include_parents'):
             self.include_parents = bool(inner_args.pop('include_parents'))
@@ -153,6 +418,16 @@ class IterIter:
         # Does the outer iter need a step
         self.outer_jump = True
 
+    def item_kwargs(self, item):
+        """
+        Get the inner function's keyword arguments for an outer item
+
+        :param item: The flattened outer item
+        :return: A dictionary of the arguments
+        """
+        return {**self.inner_args, **{name: item.get(key) for name, key
+                                      in self.item_args.items()}}
+
     def __iter__(self):
         return self
 
@@ -161,9 +436,11 @@ class IterIter:
         if self.outer_jump:
             # Get key from outer iter's return
             # When outer iter is over, StopIteration is raised
-            self.inner_key = flatten(self.outer.__next__()).get(self.key)
+            item = flatten(self.outer.__next__())
+            self.inner_key = item.get(self.key)
             # Create the inner iter by calling the function with key and args
-            self.inner = self.inner_func(self.inner_key, **self.inner_args)
+            self.inner = self.inner_func(self.inner_key,
+                                         **self.item_kwargs(item))
             # Toggle jumping off
             self.outer_jump = False
 
@@ -186,6 +463,188 @@ class IterIter:
                 return self.__next__()
 
 
+class MergeIter(Iter):
+    def __init__(self, iterators, workers=4, **kwargs):
+        """
+        Run iterators on worker threads, returning their items as they arrive
+
+        :param iterators: Functions that each create an iterator, called on
+        a worker thread
+        :param workers: The number of iterators run at once
+        """
+        super().__init__()
+
+        self._pop_options(kwargs)
+
+        self.iterators = deque(iterators)
+        self.workers = workers
+
+        self.threads = []
+        self.results = Queue(maxsize=1000)
+        self.stopped = threading.Event()
+
+        # The first error raised by an iterator
+        self.error = None
+
+    def _crawl(self):
+        while not self.stopped.is_set():
+            try:
+                create = self.iterators.popleft()
+            except IndexError:
+                break
+
+            try:
+                for item in create():
+                    self._put(item)
+                    if self.stopped.is_set():
+                        break
+            except Exception as e:
+                self._put(e)
+
+        # Wake the reader once this worker is done
+        self._put(self.stopped)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.results.put(item, timeout=1)
+                return
+            except Full:
+                pass
+
+    def _start(self):
+        for _ in range(min(self.workers, len(self.iterators))):
+            thread = threading.Thread(target=self._crawl, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def close(self):
+        """
+        Stop the running iterators
+
+        :return: None
+        """
+        self.stopped.set()
+
+    def __next__(self):
+        try:
+            return super().__next__()
+        except StopIteration:
+            self.close()
+            raise
+
+    def get_data(self):
+        if not self.threads:
+            self._start()
+
+        self.page_count += 1
+        self.data = []
+
+        while not self.data:
+            if self.error:
+                self.close()
+                if isinstance(self.error, IterError):
+                    raise self.error
+                raise IterError(self.error, vars(self))
+
+            if not any(thread.is_alive() for thread in self.threads) \
+                    and self.results.empty():
+                raise StopIteration
+
+            try:
+                items = [self.results.get(timeout=1)]
+            except Empty:
+                continue
+
+            # Take whatever else has already arrived
+            while len(items) < 100:
+                try:
+                    items.append(self.results.get_nowait())
+                except Empty:
+                    break
+
+            for item in items:
+                if isinstance(item, Exception):
+                    self.error = self.error if self.error else item
+                elif item is not self.stopped:
+                    self.data.append(item)
+
+
+class PrefetchIter(Iter):
+    def __init__(self, function, query=(), prefetch=True, **kwargs):
+        """
+        Page through a cursor, requesting the next page while the current
+        page is being returned
+
+        :param function: The api function
+        :param query: The positional arguments of the api function
+        :param prefetch: Request the next page in the background
+        """
+        super().__init__()
+
+        self.function = function
+        self.query = query
+
+        self._pop_options(kwargs)
+
+        self.params = kwargs
+
+        self.prefetch = prefetch
+        self.pool = None
+
+        # Future of the next page
+        self.next_page = None
+        self.finished = False
+
+    def _read_response(self):
+        pass
+
+    def _next_params(self):
+        """
+        Get the parameters of the next page from the response
+
+        :return: The parameters, or None if this is the last page
+        """
+        pass
+
+    def _request(self, params):
+        return self.function(*self.query, **params)
+
+    def _finish(self):
+        self.finished = True
+        if self.pool:
+            self.pool.shutdown(wait=False)
+
+    def get_data(self):
+        if self.finished:
+            raise StopIteration
+
+        self.page_count += 1
+
+        try:
+            if self.next_page:
+                self.response = self.next_page.result()
+            else:
+                self.response = self._request(self.params)
+            self.data = self._read_response()
+        except ApiError as e:
+            self._finish()
+            raise IterError(e, vars(self))
+
+        params = self._next_params()
+        if params is None or \
+                (self.max and self.total + len(self.data) >= self.max):
+            self.next_page = None
+            self._finish()
+            return
+
+        self.params = params
+        if self.prefetch:
+            if not self.pool:
+                self.pool = ThreadPoolExecutor(max_workers=1)
+            self.next_page = self.pool.submit(self._request, dict(params))
+
+
 class Facebook(Source, Shell):
     def __init__(self, access_token):
         super().__init__()
@@ -216,8 +675,9 @@ class Facebook(Source, Shell):
             self.node = node
             self.edge = edge
             self.fields = fields
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
+            if self.select and not self.fields:
+                self.fields = graph_fields(self.select)
             self.params = kwargs
 
             # Reverse paging order if in reverse mode
@@ -260,8 +720,9 @@ class Facebook(Source, Shell):
 
             self.node = node
             self.fields = fields
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
+            if self.select and not self.fields:
+                self.fields = graph_fields(self.select)
             self.params = kwargs
 
         def get_data(self):
@@ -295,8 +756,7 @@ class Twitter(Source):
             self.function = function
             self.query = query
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
 
             self.params = kwargs
 
@@ -347,6 +807,106 @@ class Twitter(Source):
         def _read_response(self):
             return self.response
 
+        def release_response(self):
+            # Only the last tweet is needed, for the next max_id
+            self.response = [self.response[-1]] if self.response else []
+
+    class PartitionedIter(MergeIter):
+        def __init__(self, iter_class, functions, query, since_id, max_id,
+                     partitions=4, workers=None, **kwargs):
+            count = kwargs.pop('count', None)
+            select = kwargs.pop('select', None)
+
+            # Iterator used to crawl each window, and the api functions the
+            # windows are shared between
+            self.iter_class = iter_class
+            self.functions = functions
+            self.query = query
+            self.params = kwargs
+
+            # Disjoint (since_id, max_id] windows, newest first
+            step = max(1, (int(max_id) - int(since_id)) // partitions)
+            bounds = list(range(int(since_id), int(max_id), step))[:partitions]
+            bounds.append(int(max_id))
+            self.windows = [(bounds[i], bounds[i + 1])
+                            for i in reversed(range(len(bounds) - 1))]
+
+            windows = [partial(self._crawl_window,
+                               functions[i % len(functions)], *window)
+                       for i, window in enumerate(self.windows)]
+            super().__init__(windows, workers if workers else len(windows),
+                             count=count, select=select)
+
+        def _crawl_window(self, function, since_id, max_id):
+            tweets = self.iter_class(function, self.query, since_id=since_id,
+                                     max_id=max_id, **self.params)
+            for tweet in tweets:
+                # Drop tweets repeated from a neighbouring window
+                if since_id < tweet['id'] <= max_id:
+                    yield tweet
+
+    @staticmethod
+    def time_to_id(timestamp):
+        """
+        Get the lowest tweet id that could have been created at a time
+
+        :param timestamp: A unix timestamp or datetime
+        :return: The tweet id
+        """
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+        return max(0, int(timestamp * 1000) - TWITTER_EPOCH) << 22
+
+    @staticmethod
+    def id_to_time(tweet_id):
+        """
+        Get the time a tweet id was created
+
+        :param tweet_id: The tweet id
+        :return: A unix timestamp
+        """
+        return ((int(tweet_id) >> 22) + TWITTER_EPOCH) / 1000
+
+    def _partitioned(self, iter_class, function, query, since, until,
+                     apis, **kwargs):
+        if since is None:
+            since = datetime.now() - timedelta(days=7)
+        until = time() if until is None else until
+
+        since_id = kwargs.pop('since_id', None) or self.time_to_id(since)
+        max_id = kwargs.pop('max_id', None) or self.time_to_id(until)
+
+        # Give each window crawl its own key when there is a pool of them
+        if not apis and isinstance(self.api, PooledApi):
+            apis = self.api.pool.apis
+
+        functions = [getattr(api, function) for api in apis] if apis \
+            else [getattr(self.api, function)]
+        return self.PartitionedIter(iter_class, functions, query, since_id,
+                                    max_id, **kwargs)
+
+    def search_partitioned(self, query, since=None, until=None, apis=None,
+                           **kwargs):
+        """
+        Search a range of time split into windows that are crawled at once
+
+        :param query: The search query
+        :param since: The start of the range, a unix timestamp or datetime
+        :param until: The end of the range, a unix timestamp or datetime
+        :param apis: Api objects to share the windows between, for using
+        more than one key. Defaults to those in the credential pool
+        :param kwargs: partitions, workers, since_id, max_id and search
+        parameters
+        :return: A PartitionedIter
+        """
+        return self._partitioned(self.SearchIter, 'search', query, since,
+                                 until, apis, **kwargs)
+
+    def user_partitioned(self, query, since=None, until=None, apis=None,
+                         **kwargs):
+        return self._partitioned(self.UserIter, 'user', query, since, until,
+                                 apis, **kwargs)
+
     def search(self, query, **kwargs):
         return self.SearchIter(self.api.search, query, **kwargs)
 
@@ -355,13 +915,13 @@ class Twitter(Source):
 
 
 class Reddit(Source):
-    def __init__(self, application_id, application_secret):
+    def __init__(self, application_id, application_secret, token_store=None):
         super().__init__()
 
         self.application_id = application_id
         self.application_secret = application_secret
 
-        self.api = RedditApi(application_id, application_secret)
+        self.api = RedditApi(application_id, application_secret, token_store)
 
     class RedditIter(Iter):
         def __init__(self, function, **kwargs):
@@ -369,8 +929,7 @@ class Reddit(Source):
 
             self.function = function
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
 
             self.params = kwargs
 
@@ -467,6 +1026,26 @@ class Reddit(Source):
         def _read_response(self):
             return self.response[0]['data']['children']
 
+    class InfoIter(RedditIter):
+        def __init__(self, function, fullnames, **kwargs):
+            super().__init__(function, **kwargs)
+
+            # Stream of fullnames to look up, consumed as pages are requested
+            self.fullnames = iter(fullnames)
+
+            # Maximum number of fullnames sent in a single request
+            self.chunk_size = 100
+
+        def _get_after(self):
+            chunk = list(islice(self.fullnames, self.chunk_size))
+            if not chunk:
+                raise StopIteration
+
+            self.params['fullnames'] = chunk
+
+        def _read_response(self):
+            return self.response['data']['children']
+
     class ThreadCommentsIter(Iter):
         def __init__(self, api, subreddit, thread, **kwargs):
             super().__init__()
@@ -478,95 +1057,167 @@ class Reddit(Source):
             self.params = kwargs
 
             self.level = 0
-            self.reply_data = []
-            self.more = []
-            self.more_i = 0
-            self.chunk_size = 1
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            # Comment ids from 'more' stubs, waiting to be expanded
+            self.more = deque()
+            self.more_seen = set()
+
+            # Comment ids behind 'continue this thread' stubs
+            self.sub_threads = deque()
+            self.sub_threads_seen = set()
+
+            # Maximum number of ids sent in a single morechildren call
+            self.chunk_size = 100
 
-        def _extract_comment(self, comment):
+            # Number of requests made for the thread
+            self.request_count = 0
+
+            self._pop_options(kwargs)
+
+        def _queue_more(self, more):
             """
-            Get the parent comment and replies from a comment
+            Queue the ids of a 'more' stub for expansion. Stubs without
+            children are 'continue this thread' links to their parent comment
 
-            :param comment: The parent comment
-            :return: A list of comments, with the parent at the start
+            :param more: The 'more' stub
+            :return: None
             """
 
-            lst = []
-            if comment['data'].get('replies'):
-                for reply in comment['data']['replies']['data']['children']:
-                    # print(f"{reply['data']['id']}: {reply['kind']}")
-                    if reply['kind'] == 'more' and reply['data']['children']:
-                        self.more.append(reply['data']['children'])
-                    else:
-                        lst.append(reply)
-                        comments = self._extract_comment(reply)
-                        lst.extend(comments)
+            children = more['data'].get('children')
+            if children:
+                for child in children:
+                    if child not in self.more_seen:
+                        self.more_seen.add(child)
+                        self.more.append(child)
+                return
 
-                # del comment['data']['replies']
-            return lst
+            kind, _, parent = more['data'].get('parent_id', '').partition('_')
+            if kind == 't1' and parent not in self.sub_threads_seen:
+                self.sub_threads_seen.add(parent)
+                self.sub_threads.append(parent)
 
-        def _classify_comment(self, comments, more_data=False):
-            data = []
-            data.extend(comments)
-
-            if more_data:
-                for comment in comments:
-                    if comment['kind'] == 'more':
-                        if comment['data']['children']:
-                            self.more.append(comment['data']['children'])
-
-                        sub_thread = comment['data']['parent_id'].split('_')[1]
-                        # sub_thread_data = self.function(self.thread, self.subreddit, sub_thread=sub_thread)
-                        # root_comment = sub_thread_data[1]['data']['children']
-                        # data.extend(self._classify_comment(root_comment))
-
-                        sub_thread_data = Reddit.ThreadCommentsIter(self.api,
-                                                                    self.subreddit,
-                                                                    self.thread,
-                                                                    sub_thread=sub_thread)
-                        sub_thread_data = list(sub_thread_data)
-                        data.extend(sub_thread_data)
-
-            for comment in comments:
-                replies = self._extract_comment(comment)
-                data.extend(replies)
+        def _walk(self, comments, depth=0, parent=None):
+            """
+            Walk a comment tree in pre-order without recursion. Each comment
+            is given its depth and parent id, and has its replies removed
+            once they have been queued, so only the unvisited frontier of the
+            tree is held in memory
+
+            :param comments: The list of top level comments, emptied in place
+            :param depth: The depth of the top level comments
+            :param parent: The fullname of the top level comments' parent
+            :return: A generator of comments
+            """
 
-            return data
+            stack = [(comment, depth, parent) for comment in reversed(comments)]
+            del comments[:]
+
+            while stack:
+                comment, depth, parent = stack.pop()
+                if comment['kind'] == 'more':
+                    self._queue_more(comment)
+                    continue
+
+                data = comment['data']
+                data.setdefault('depth', depth)
+                if parent:
+                    data.setdefault('parent_id', parent)
+
+                replies = data.pop('replies', None)
+                if replies:
+                    children = replies['data']['children']
+                    stack.extend((reply, depth + 1, data.get('name'))
+                                 for reply in reversed(children))
+
+                yield comment
+
+        def _walk_replies(self, roots):
+            """
+            Walk the replies of comments that have already been returned
+
+            :param roots: The list of root comments, emptied in place
+            :return: A generator of comments
+            """
+
+            for root in roots:
+                if root['kind'] == 'more':
+                    self._queue_more(root)
+                    continue
+
+                data = root['data']
+                replies = data.get('replies')
+                if replies:
+                    yield from self._walk(replies['data']['children'],
+                                          data.get('depth', 0) + 1,
+                                          data.get('name'))
+            del roots[:]
+
+        def __next__(self):
+            # Comments are taken from the tree walker as they are needed
+            while True:
+                for comment in self.data:
+                    self.total += 1
+                    if self.max and self.total > self.max:
+                        raise StopIteration
+
+                    if self.select:
+                        comment = self.project(comment)
+                    if self.track_headings:
+                        self.headings.update(comment.keys())
+                    return comment
+
+                self.get_page()
+
+        def release_response(self):
+            # The tree walker holds the comments it has yet to return
+            self.response = {}
+
+        def _next_chunk(self):
+            chunk = []
+            while self.more and len(chunk) < self.chunk_size:
+                chunk.append(self.more.popleft())
+            return chunk
 
         def get_data(self):
             self.page_count += 1
 
-            if self.level == 0:
-                try:
+            try:
+                if self.level == 0:
+                    self.level = 1
+                    self.request_count += 1
                     self.response = self.function(self.thread, self.subreddit,
                                                   **self.params)
-                    self.data = self.response[1]['data']['children']
-                    self.data = self._classify_comment(self.data)
-                except ApiError as e:
-                    raise IterError(e, vars(self))
-                self.level = 1
-                return
-
-            elif self.level == 1:
-                if self.more_i < len(self.more):
-                    # chunk = self.more[self.more_i:self.more_i + self.chunk_size]
-                    # self.more_i += len(chunk)
+                    self.data = self._walk(
+                        self.response[1]['data']['children'])
+                    return
 
-                    chunk = self.more[self.more_i]
-                    self.more_i += 1
+                if self.more:
+                    self.request_count += 1
+                    self.response = self.api.more_children(
+                        self._next_chunk(), "t3_" + self.thread)
+                    self.data = self._walk(
+                        self.response['json']['data']['things'])
+                    return
 
-                    self.response = self.api.more_children(chunk,
-                                                           "t3_" + self.thread)
+                if self.sub_threads:
+                    self.request_count += 1
+                    self.response = self.function(
+                        self.thread, self.subreddit,
+                        sub_thread=self.sub_threads.popleft(), **self.params)
 
-                    self.data = self._classify_comment(
-                        self.response['json']['data']['things'], more_data=True)
+                    # The root of a sub thread has already been returned
+                    self.data = self._walk_replies(
+                        self.response[1]['data']['children'])
                     return
 
+            except ApiError as e:
+                raise IterError(e, vars(self))
+
             raise StopIteration
 
+        def get_request_count(self):
+            return self.request_count
+
     def search(self, query, **kwargs):
         return self.SearchIter(self.api.search, query, **kwargs)
 
@@ -575,7 +1226,7 @@ class Reddit(Source):
 
     def search_thread_comments(self, query, **kwargs):
         return IterIter(self.search(query), 'data.id', self.thread_comments,
-                        kwargs)
+                        kwargs, {'subreddit': 'data.subreddit'})
 
     def subreddit(self, subreddit, **kwargs):
         return self.SubredditIter(self.api.subreddit, subreddit, **kwargs)
@@ -586,7 +1237,8 @@ class Reddit(Source):
 
     def subreddit_thread_comments(self, subreddit, **kwargs):
         return IterIter(self.subreddit(subreddit), 'data.id',
-                        self.thread_comments, kwargs)
+                        self.thread_comments, kwargs,
+                        {'subreddit': 'data.subreddit'})
 
     def user(self, user, **kwargs):
         return self.UserIter(self.api.user, user, **kwargs)
@@ -598,31 +1250,45 @@ class Reddit(Source):
     def thread_comments(self, thread, subreddit, **kwargs):
         return self.ThreadCommentsIter(self.api, subreddit, thread, **kwargs)
 
+    def info(self, fullnames, **kwargs):
+        return self.InfoIter(self.api.info, fullnames, **kwargs)
+
     def thread_comments_user(self, subreddit, thread, **kwargs):
         return IterIter(self.thread_comments(subreddit, thread), 'data.author',
                         self.user, kwargs)
 
 
 class YouTube(Source):
-    def __init__(self, api_key):
+    def __init__(self, api_key, quota=None):
         super().__init__()
 
         self.api_key = api_key
 
-        self.api = YoutubeApi(api_key)
+        self.api = YoutubeApi(api_key, quota)
 
     class YouTubeIter(Iter):
+        # Items are returned as the response has them, so the selected keys
+        # can be sent as a fields filter
+        select_fields = True
+
+        # Keys of each item the iterator needs, kept in the fields filter
+        required_fields = ()
+
         def __init__(self, function, query, **kwargs):
             super().__init__()
 
             self.function = function
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
 
             self.params = kwargs
             self.query = query
 
+            # Trim the response on the api side too
+            if self.select and self.select_fields:
+                self.params.setdefault('fields', youtube_fields(
+                    self.select, self.required_fields))
+
         def _read_response(self):
             pass
 
@@ -655,6 +1321,26 @@ class YouTube(Source):
             else:
                 raise StopIteration
 
+    class YoutubePlaylistIter(YouTubeSearchIter):
+        def __init__(self, function, playlist, resolve=None, **kwargs):
+            super().__init__(function, playlist, **kwargs)
+
+            # Function to find the playlist id from the query, called once
+            self.resolve = resolve
+
+        def get_data(self):
+            if self.resolve:
+                try:
+                    self.query = self.resolve(self.query)
+                except ApiError as e:
+                    raise IterError(e, vars(self))
+                self.resolve = None
+
+                if not self.query:
+                    raise StopIteration
+
+            super().get_data()
+
     class YoutubeVideoIter(YouTubeIter):
         def _read_response(self):
             return self.response['items']
@@ -663,6 +1349,62 @@ class YouTube(Source):
             if self.response:
                 raise StopIteration
 
+    class YoutubeVideosIter(YouTubeIter):
+        # Videos are matched to the requested ids
+        required_fields = ('id',)
+
+        def __init__(self, function, records, key=None, join_key='video',
+                     **kwargs):
+            # Path to the video id in each record, None if records are ids
+            self.key = key
+            self.select_fields = not key
+
+            super().__init__(function, iter(records), **kwargs)
+
+            # Key the video is added to each record under
+            self.join_key = join_key
+
+            # Maximum number of ids sent in a single request
+            self.chunk_size = 50
+
+        def _video_id(self, record):
+            if self.key:
+                return flatten(record).get(self.key)
+            return record
+
+        def get_data(self):
+            records = list(islice(self.query, self.chunk_size))
+            if not records:
+                raise StopIteration
+
+            self.page_count += 1
+
+            record_ids = [self._video_id(record) for record in records]
+            ids = []
+            for video_id in record_ids:
+                if video_id and video_id not in ids:
+                    ids.append(video_id)
+
+            try:
+                self.response = self.function(ids, **self.params) if ids \
+                    else {'items': []}
+            except ApiError as e:
+                raise IterError(e, vars(self))
+
+            videos = {video['id']: video for video in self.response['items']}
+            if not self.key:
+                self.data = [videos[video_id] for video_id in ids
+                             if video_id in videos]
+                return
+
+            for record, video_id in zip(records, record_ids):
+                record[self.join_key] = videos.get(video_id)
+            self.data = records
+
+        def release_response(self):
+            # The videos have been copied out of the response
+            self.response = {}
+
     class YoutubeThreadCommentsIter(YouTubeIter):
         def _read_response(self):
             return self.response['items']
@@ -675,29 +1417,149 @@ class YouTube(Source):
                 raise StopIteration
 
     class YoutubeVideoCommentsIter(YouTubeIter):
-        def __init__(self, function, thread_replies, video_id, **kwargs):
+        select_fields = False
+
+        def __init__(self, function, thread_replies, video_id,
+                     reply_workers=4, **kwargs):
+            """
+            Get a video's comment threads, fetching the replies of threads
+            and the next page of threads in a pool. The requests still start
+            request_rate apart, so only their latency overlaps unless the
+            api is given a rate for replies, eg.
+            api.endpoint_rates['comments'] = 0.5. Call close when stopping
+            before the end
+
+            :param function: The function that gets a page of threads
+            :param thread_replies: A function that creates an iterator of a
+            thread's replies
+            :param video_id: The id of the video
+            :param reply_workers: The number of threads whose replies are
+            fetched at once
+            """
             super().__init__(function, video_id, **kwargs)
             self.thread_replies = thread_replies
 
+            # Replies, and the next page of threads, are fetched in the pool.
+            # It is made when needed, so a closed iterator can carry on
+            self.reply_workers = reply_workers
+            self.pool = None
+            self.closed = threading.Event()
+
+            # Replies waiting to be returned, as lists, or as the thread id
+            # and the future of its replies, None once cancelled
+            self.pending = deque()
+
+            # Future of the next page of comment threads, and whether there
+            # is a next page, at params['page']
+            self.next_page = None
+            self.more_pages = True
+
+        def _submit(self, function, *args, **kwargs):
+            if not self.pool:
+                self.pool = ThreadPoolExecutor(
+                    max_workers=self.reply_workers + 1)
+                self.closed = threading.Event()
+            return self.pool.submit(function, *args, **kwargs)
+
+        def _fetch_replies(self, thread_id, closed):
+            replies = []
+            for reply in self.thread_replies(thread_id):
+                if closed.is_set():
+                    break
+                replies.append(reply)
+            return replies
+
+        def close(self):
+            """
+            Cancel the requests not yet started, and stop reply crawls after
+            their current page. The replies and page not fetched are kept,
+            so iterating again after an error, eg. once there is quota,
+            requests them again
+
+            :return: None
+            """
+            self.closed.set()
+            for i, entry in enumerate(self.pending):
+                if isinstance(entry, tuple):
+                    if entry[1]:
+                        entry[1].cancel()
+                    self.pending[i] = (entry[0], None)
+            if self.next_page:
+                self.next_page.cancel()
+                self.next_page = None
+            if self.pool:
+                self.pool.shutdown(wait=False)
+                self.pool = None
+
+        def __next__(self):
+            try:
+                return super().__next__()
+            except BaseException:
+                # The end, the count being reached, or an error
+                self.close()
+                raise
+
         def _read_response(self):
             data = self.response['items']
+            replies = []
             for thread in data:
                 if thread.get('replies'):
                     if len(thread['replies']['comments']) == thread['snippet'][
                         'totalReplyCount']:
-                        data.extend(thread['replies']['comments'])
+                        replies.extend(thread['replies']['comments'])
                     else:
-                        data.extend(self.thread_replies(thread['id']))
+                        self.pending.append(replies)
+                        self.pending.append((thread['id'], self._submit(
+                            self._fetch_replies, thread['id'], self.closed)))
+                        replies = []
                     del thread['replies']
+            self.pending.append(replies)
 
             return data
 
-        def _get_after(self):
+        def _next_replies(self):
+            entry = self.pending[0]
+            if isinstance(entry, tuple):
+                thread_id, future = entry
+                if not future:
+                    future = self._submit(self._fetch_replies, thread_id,
+                                          self.closed)
+                    self.pending[0] = (thread_id, future)
+                entry = future.result()
+            self.pending.popleft()
+            return entry
+
+        def get_data(self):
+            # Return the replies of a page before moving onto the next page
+            if self.pending:
+                self.data = self._next_replies()
+                return
+
+            if not self.more_pages:
+                raise StopIteration
+            if not self.next_page:
+                self.next_page = self._submit(self.function, self.query,
+                                              **self.params)
+
+            self.page_count += 1
+
+            try:
+                self.response = self.next_page.result()
+            except ApiError as e:
+                # The page is requested again if iterating carries on
+                self.next_page = None
+                raise IterError(e, vars(self))
+            self.next_page = None
+            self.data = self._read_response()
+
+            # Request the next page while the replies are being fetched
             nextPage = self.response.get('nextPageToken')
-            if nextPage or self.page_count == 1:
+            if nextPage:
                 self.params['page'] = nextPage
+                self.next_page = self._submit(self.function, self.query,
+                                              **self.params)
             else:
-                raise StopIteration
+                self.more_pages = False
 
     def search(self, query, **kwargs):
         return self.YouTubeSearchIter(self.api.search, query, **kwargs)
@@ -707,16 +1569,49 @@ class YouTube(Source):
                         kwargs)
 
     def channel(self, channel, **kwargs):
+        return self.YoutubePlaylistIter(self.api.playlist_items, channel,
+                                        resolve=self.api.uploads_playlist,
+                                        **kwargs)
+
+    def channel_search(self, channel, **kwargs):
         return self.YouTubeSearchIter(self.api.search, None, channel_id=channel,
                                       **kwargs)
 
     def channel_comments(self, channel, **kwargs):
-        return IterIter(self.search(channel), 'id.videoId', self.video_comments,
-                        kwargs)
+        return IterIter(self.channel(channel), 'contentDetails.videoId',
+                        self.video_comments, kwargs)
+
+    def playlist(self, playlist, **kwargs):
+        return self.YoutubePlaylistIter(self.api.playlist_items, playlist,
+                                        **kwargs)
+
+    @staticmethod
+    def _select_parts(select):
+        # Parts of a video that hold the selected keys
+        return [root for root in select_roots(select)
+                if root not in ('kind', 'etag')]
 
     def video(self, video, **kwargs):
+        if kwargs.get('select') and not kwargs.get('parts'):
+            kwargs['parts'] = self._select_parts(kwargs['select'])
         return self.YoutubeVideoIter(self.api.videos, video, **kwargs)
 
+    def videos(self, records, key=None, parts=None, **kwargs):
+        """
+        Look up videos 50 at a time
+
+        :param records: An iterable of video ids, or records containing them
+        :param key: The flattened path to the video id in each record, eg.
+        'id.videoId' for search results. None if records are video ids
+        :param parts: The parts of each video to request, eg. 'statistics'
+        :return: The videos, or the records with their video under 'video'
+        """
+        if not parts:
+            parts = self._select_parts(kwargs['select']) \
+                if kwargs.get('select') and not key else ["statistics"]
+        return self.YoutubeVideosIter(self.api.videos, records, key=key,
+                                      parts=parts, **kwargs)
+
     def thread_replies(self, video_id, **kwargs):
         return self.YoutubeThreadCommentsIter(self.api.comments_list, video_id,
                                               **kwargs)
@@ -738,8 +1633,7 @@ class Tumblr(Source):
 
             self.function = function
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            self._pop_options(kwargs)
 
             self.params = kwargs
             self.query = query
@@ -769,6 +1663,31 @@ class Tumblr(Source):
                 raise StopIteration
 
     class TumblrPostsIter(TumblrIter):
+        def __init__(self, function, query, workers=1, buffer_size=None,
+                     refetches=2, **kwargs):
+            super().__init__(function, query, **kwargs)
+
+            # Pages fetched at once, once the number of posts is known
+            self.workers = workers
+            self.limit = self.params.get('limit', 20)
+            self.total_posts = None
+
+            # Offsets of the pages that haven't been requested yet
+            self.offsets = deque()
+            self.next_offset = 0
+
+            # Futures of requested pages, by offset. Pages that arrive early
+            # wait here, so its size bounds the pages held out of order
+            self.in_flight = {}
+            self.buffer_size = max(buffer_size if buffer_size else
+                                   workers * 2, workers)
+
+            # Times an incomplete or failed page is requested again
+            self.refetches = refetches
+            self.refetched = []
+
+            self.pool = None
+
         def _read_response(self):
             posts = self.response['response']['posts']
             if len(posts) > 0:
@@ -782,17 +1701,160 @@ class Tumblr(Source):
             else:
                 self.params['offset'] = 0
 
+        def _fetch(self, offset):
+            return self.function(self.query, **{**self.params, 'offset': offset})
+
+        def close(self):
+            """
+            Cancel the pages requested but not yet started
+
+            :return: None
+            """
+            for future in self.in_flight.values():
+                future.cancel()
+            self.in_flight.clear()
+            self.offsets.clear()
+            if self.pool:
+                self.pool.shutdown(wait=False)
+
+        def __next__(self):
+            try:
+                return super().__next__()
+            except BaseException:
+                # The end, the count being reached, or an error
+                self.close()
+                raise
+
+        def _fill(self):
+            while self.offsets and len(self.in_flight) < self.buffer_size:
+                offset = self.offsets.popleft()
+                self.in_flight[offset] = self.pool.submit(self._fetch, offset)
+
+        def _page(self, offset):
+            """
+            Wait for the page at an offset, requesting it again if it failed
+            or is missing posts
+
+            :param offset: The offset of the page
+            :return: The response
+            """
+
+            future = self.in_flight.pop(offset)
+            expected = min(self.limit, self.total_posts - offset)
+            response = None
+            error = None
+
+            for attempt in range(self.refetches + 1):
+                if attempt:
+                    self.refetched.append(offset)
+                    future = self.pool.submit(self._fetch, offset)
+
+                try:
+                    response = future.result()
+                    error = None
+                    if len(response['response']['posts']) >= expected:
+                        break
+                except ApiError as e:
+                    error = e
+
+            if error:
+                raise error
+            return response
+
+        def get_data(self):
+            if self.workers < 2:
+                return super().get_data()
+
+            self.page_count += 1
+
+            try:
+                if self.total_posts is None:
+                    self.response = self._fetch(self.next_offset)
+                    self.total_posts = self.response['response'].get(
+                        'total_posts', 0)
+                    self.offsets.extend(range(self.next_offset + self.limit,
+                                              self.total_posts, self.limit))
+                    self.pool = ThreadPoolExecutor(max_workers=self.workers)
+                elif self.next_offset in self.in_flight:
+                    self.response = self._page(self.next_offset)
+                else:
+                    raise StopIteration
+
+                # Pages emptied by deleted posts don't end the crawl
+                self.data = self.response['response']['posts']
+                self.next_offset += self.limit
+            except ApiError as e:
+                self.close()
+                raise IterError(e, vars(self))
+
+            self._fill()
+
     class TumblrTagIter(TumblrIter):
+        def __init__(self, function, query, since=None, seen_size=1000,
+                     **kwargs):
+            """
+            Page through a tag's posts by timestamp, dropping posts repeated
+            across pages. The tagged endpoint pages only by timestamp, with
+            no offset, so when a full page of posts shares a timestamp the
+            rest of the posts at it can't be reached. The crawl moves past
+            it, and the timestamp is added to skipped
+
+            :param function: The function that gets a page of posts
+            :param query: The tag
+            :param since: Posts from before this timestamp aren't returned
+            :param seen_size: The number of recent post ids kept to drop
+            repeats
+            """
+            super().__init__(function, query, **kwargs)
+
+            # Posts from before this timestamp aren't returned
+            self.since = since
+
+            # Ids of the most recent posts, to drop posts repeated by paging
+            self.seen = OrderedDict()
+            self.seen_size = seen_size
+
+            self.last_timestamp = None
+            self.stalled = False
+            self.finished = False
+
+            # Timestamps moved past while posts at them may remain
+            self.skipped = []
+
         def _read_response(self):
             posts = self.response['response']
-            if len(posts) > 0:
-                return posts
-            else:
+            if len(posts) == 0:
                 raise StopIteration
 
+            data = []
+            for post in posts:
+                if post['id'] in self.seen:
+                    continue
+                if self.since and post['timestamp'] < self.since:
+                    self.finished = True
+                    continue
+
+                self.seen[post['id']] = None
+                if len(self.seen) > self.seen_size:
+                    self.seen.popitem(last=False)
+                data.append(post)
+
+            self.last_timestamp = posts[-1]['timestamp']
+            self.stalled = not data
+            # Only a full page can leave posts behind
+            if self.stalled and len(posts) >= self.params.get('limit', 20):
+                self.skipped.append(self.last_timestamp)
+            return data
+
         def _get_after(self):
-            if len(self.data) > 0:
-                self.params['before'] = self.data[-1]['timestamp']
+            if self.finished:
+                raise StopIteration
+
+            if self.last_timestamp is not None:
+                # Posts can share the last timestamp, so ask for it again and
+                # drop the repeats. Move past it if a page was all repeats
+                self.params['before'] = self.last_timestamp + \
+                    (0 if self.stalled else 1)
 
     def blog_info(self, blog, **kwargs):
         return self.TumblrBlogIter(self.api.blog, blog, **kwargs)
@@ -803,83 +1865,247 @@ class Tumblr(Source):
     def tag_posts(self, tag, **kwargs):
         return self.TumblrTagIter(self.api.tag, tag, **kwargs)
 
+    def tag_posts_sliced(self, tag, since, until=None, slices=4, workers=None,
+                         **kwargs):
+        """
+        Split a range of time into slices, and crawl a tag's posts in each
+        slice at once
+
+        :param tag: The tag
+        :param since: The start of the range, a unix timestamp or datetime
+        :param until: The end of the range, a unix timestamp or datetime
+        :param slices: The number of slices
+        :param workers: The number of slices crawled at once
+        :param kwargs: Tag parameters
+        :return: A MergeIter
+        """
+        if isinstance(since, datetime):
+            since = since.timestamp()
+        if isinstance(until, datetime):
+            until = until.timestamp()
+        until = time() if until is None else until
+
+        count = kwargs.pop('count', None)
+        step = (until - since) / slices
+        bounds = [int(since + step * i) for i in range(slices)] + [int(until)]
+        iterators = [partial(self.TumblrTagIter, self.api.tag, tag,
+                             before=bounds[i + 1], since=bounds[i], **kwargs)
+                     for i in reversed(range(slices))]
+
+        return MergeIter(iterators, workers if workers else slices,
+                         count=count)
+
 
 class Pinterest(Source):
     def __init__(self, access_token):
         self.access_token = access_token
         self.api = PinterestAPI(access_token)
 
-    class PinterestIter(Iter):
+    class PinterestIter(PrefetchIter):
+        # Largest page the api returns
+        max_limit = 100
+
         def __init__(self, function, query, **kwargs):
+            super().__init__(function, query, **kwargs)
+
+            limit = min(self.max, self.max_limit) if self.max \
+                else self.max_limit
+            self.params.setdefault('limit', limit)
+
+            edge, fields = self.query[:2]
+            if self.select and not fields:
+                self.query = (edge, select_roots(self.select)) + \
+                    self.query[2:]
+
+    class PinterestUserIter(PinterestIter):
+        def _read_response(self):
+            data = self.response['data']
+            if isinstance(data, list):
+                return data
+            else:
+                return [data]
+
+        def _next_params(self):
+            if self.response.get('page'):
+                cursor = self.response['page'].get('cursor')
+                if cursor:
+                    return {**self.params, 'cursor': cursor}
+
+    class PinterestLookupIter(Iter):
+        def __init__(self, function, ids, edge, fields=None, workers=4,
+                     **kwargs):
             super().__init__()
 
             self.function = function
 
-            if kwargs.get('count'):
-                self.max = int(kwargs.pop('count'))
+            # Stream of ids, and the edge each is looked up on
+            self.ids = iter(ids)
+            self.edge = edge
+            self.fields = fields
+
+            self._pop_options(kwargs)
+            if self.select and not self.fields:
+                self.fields = select_roots(self.select)
 
             self.params = kwargs
-            self.query = query
 
-            self.run = False
+            # Futures of the lookups, in order. At most buffer_size run ahead
+            self.pool = ThreadPoolExecutor(max_workers=workers)
+            self.pending = deque()
+            self.buffer_size = workers * 2
 
-        def _read_response(self):
-            pass
+        def close(self):
+            """
+            Cancel the lookups not yet started
 
-        def _get_after(self):
-            pass
+            :return: None
+            """
+            for future in self.pending:
+                future.cancel()
+            self.pending.clear()
+            self.pool.shutdown(wait=False)
+
+        def __next__(self):
+            try:
+                return super().__next__()
+            except BaseException:
+                # The end, the count being reached, or an error
+                self.close()
+                raise
+
+        def _fill(self):
+            while len(self.pending) < self.buffer_size:
+                try:
+                    item_id = next(self.ids)
+                except StopIteration:
+                    return
+                self.pending.append(self.pool.submit(
+                    self.function, self.edge.format(item_id), self.fields,
+                    self.edge.replace('{}', '{id}'), **self.params))
 
         def get_data(self):
-            self.page_count += 1
+            self._fill()
+            if not self.pending:
+                raise StopIteration
 
-            self._get_after()
+            self.page_count += 1
 
             try:
-                self.response = self.function(*self.query, **self.params)
-                self.data = self._read_response()
+                self.response = self.pending.popleft().result()
+                self.data = [self.response['data']]
             except ApiError as e:
                 raise IterError(e, vars(self))
 
-    class PinterestUserIter(PinterestIter):
-        def _read_response(self):
-            data = self.response['data']
-            if isinstance(data, list):
-                return data
-            else:
-                return [data]
-
-        def _get_after(self):
-            if self.page_count == 1:
-                return
-            if self.response.get('page'):
-                cursor = self.response['page'].get('cursor')
-                if cursor:
-                    self.params['cursor'] = cursor
-                    return
-            raise StopIteration
+            self._fill()
 
     def user(self, user, fields=None, **kwargs):
-        return self.PinterestUserIter(self.api.read_edge, (f"{user}/", fields),
+        return self.PinterestUserIter(self.api.read_edge,
+                                      (f"{user}/", fields, "{user}/"),
                                       **kwargs)
 
     def user_boards(self, user, fields=None, **kwargs):
         return self.PinterestUserIter(self.api.read_edge,
-                                      (f"{user}/boards/", fields), **kwargs)
+                                      (f"{user}/boards/", fields,
+                                       "{user}/boards/"), **kwargs)
 
     def user_pins(self, user, fields=None, **kwargs):
         return self.PinterestUserIter(self.api.read_edge,
-                                      (f"{user}/pins/", fields), **kwargs)
+                                      (f"{user}/pins/", fields,
+                                       "{user}/pins/"), **kwargs)
 
     def board(self, user, board, fields=None, **kwargs):
         return self.PinterestUserIter(self.api.read_edge,
-                                      (f"boards/{user}/{board}/", fields),
-                                      **kwargs)
+                                      (f"boards/{user}/{board}/", fields,
+                                       "boards/{id}/"), **kwargs)
 
     def board_pins(self, user, board, fields=None, **kwargs):
         return self.PinterestUserIter(self.api.read_edge,
-                                      (f"boards/{user}/{board}/pins/", fields),
-                                      **kwargs)
+                                      (f"boards/{user}/{board}/pins/", fields,
+                                       "boards/{id}/pins/"), **kwargs)
 
     def pin(self, pin, fields=None, **kwargs):
         return self.PinterestUserIter(self.api.read_edge,
-                                      (f"pins/{pin}/", fields), **kwargs)
+                                      (f"pins/{pin}/", fields, "pins/{id}/"),
+                                      **kwargs)
+
+    def pins(self, pins, fields=None, **kwargs):
+        """
+        Look up many pins at once
+
+        :param pins: An iterable of pin ids
+        :param fields: The fields of each pin to get
+        :param kwargs: workers, the number of lookups made at once. They
+        start request_rate apart unless the api is given a rate for them, eg.
+        api.endpoint_rates['pins/{id}/'] = 1
+        :return: The pins, in the order of their ids
+        """
+        return self.PinterestLookupIter(self.api.read_edge, pins, "pins/{}/",
+                                        fields, **kwargs)
+
+    def boards(self, boards, fields=None, **kwargs):
+        """
+        Look up many boards at once
+
+        :param boards: An iterable of board ids, or 'user/board' names
+        :param fields: The fields of each board to get
+        :param kwargs: workers, the number of lookups made at once. They
+        start request_rate apart unless the api is given a rate for them, eg.
+        api.endpoint_rates['boards/{id}/'] = 1
+        :return: The boards, in the order of their ids
+        """
+        return self.PinterestLookupIter(self.api.read_edge, boards,
+                                        "boards/{}/", fields, **kwargs)
+
+
+class Twitch(Source):
+    def __init__(self, client_id, access_token=None):
+        self.client_id = client_id
+        self.api = TwitchApi(client_id, access_token)
+
+    class TwitchIter(PrefetchIter):
+        def _read_response(self):
+            return self.response['data']
+
+        def _next_params(self):
+            cursor = self.response.get('pagination', {}).get('cursor')
+            if cursor and self.response['data']:
+                return {**self.params, 'after': cursor}
+
+    class TwitchUsersIter(PrefetchIter):
+        def __init__(self, function, logins, **kwargs):
+            super().__init__(function, **kwargs)
+
+            # Stream of logins to look up, consumed as pages are requested
+            self.logins = iter(logins)
+
+            # Maximum number of logins sent in a single request
+            self.chunk_size = 100
+
+            self.params = self._next_params()
+            if self.params is None:
+                self.finished = True
+
+        def _read_response(self):
+            return self.response['data']
+
+        def _next_params(self):
+            chunk = list(islice(self.logins, self.chunk_size))
+            if chunk:
+                return {**self.params, 'login': chunk}
+
+    def videos(self, user_id=None, game_id=None, **kwargs):
+        return self.TwitchIter(self.api.videos, user_id=user_id,
+                               game_id=game_id, **kwargs)
+
+    def clips(self, broadcaster_id=None, game_id=None, **kwargs):
+        return self.TwitchIter(self.api.clips, broadcaster_id=broadcaster_id,
+                               game_id=game_id, **kwargs)
+
+    def streams(self, **kwargs):
+        return self.TwitchIter(self.api.streams, **kwargs)
+
+    def users(self, logins, **kwargs):
+        return self.TwitchUsersIter(self.api.users, logins, **kwargs)
+
+    def users_videos(self, logins, **kwargs):
+        return IterIter(self.users(logins), 'id', self.videos, kwargs)
@@ -0,0 +1,226 @@
+import threading
+from time import time
+
+from . import codec
+
+
+class Metrics:
+    """
+    Counts requests, waits and pages. Each event is also passed to the
+    hooks, functions called with the event name and a dictionary of details
+    """
+
+    def __init__(self):
+        self.hooks = []
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the counts
+
+        :return: None
+        """
+
+        with self.lock:
+            # Counts for each (api, endpoint)
+            self.endpoints = {}
+
+            # Seconds spent waiting, for each reason
+            self.waits = {}
+
+            # Seconds spent decoding responses
+            self.decode_seconds = 0
+
+            # Pages, items and seconds for each kind of iterator
+            self.iterators = {}
+
+            self.started = time()
+
+    def add_hook(self, hook):
+        """
+        Call a function with every event
+
+        :param hook: A function taking the event name and its details
+        :return: None
+        """
+
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, event, **details):
+        for hook in self.hooks:
+            hook(event, details)
+
+    def request(self, api, endpoint, seconds, status=None, size=0, retry=0,
+                error=None):
+        """
+        Record a request attempt
+
+        :param api: The name of the api
+        :param endpoint: The endpoint requested
+        :param seconds: The latency of the request
+        :param status: The http status code, None if there was no response
+        :param size: Bytes received
+        :param retry: 0 for the first attempt, then the number of the retry
+        :param error: The error raised, if the request failed
+        :return: None
+        """
+
+        with self.lock:
+            counts = self.endpoints.setdefault((api, endpoint), {
+                'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0,
+                'seconds': 0, 'statuses': {}})
+            counts['requests'] += 1
+            counts['seconds'] += seconds
+            counts['bytes'] += size
+            if retry:
+                counts['retries'] += 1
+            if error is not None:
+                counts['errors'] += 1
+            status_key = str(status) if status else 'none'
+            counts['statuses'][status_key] = \
+                counts['statuses'].get(status_key, 0) + 1
+
+        self.emit('request', api=api, endpoint=endpoint, seconds=seconds,
+                  status=status, bytes=size, retry=retry,
+                  error=str(error) if error is not None else None)
+
+    def wait(self, reason, seconds):
+        """
+        Record time spent waiting, eg. for the rate limit or a retry
+
+        :param reason: Why the wait happened
+        :param seconds: The length of the wait
+        :return: None
+        """
+
+        with self.lock:
+            self.waits[reason] = self.waits.get(reason, 0) + seconds
+        self.emit('wait', reason=reason, seconds=seconds)
+
+    def decode(self, api, seconds):
+        with self.lock:
+            self.decode_seconds += seconds
+        self.emit('decode', api=api, seconds=seconds)
+
+    def page(self, iterator, items, seconds):
+        """
+        Record a page fetched by an iterator
+
+        :param iterator: The name of the iterator
+        :param items: The number of items in the page
+        :param seconds: The time taken to get the page
+        :return: None
+        """
+
+        with self.lock:
+            counts = self.iterators.setdefault(
+                iterator, {'pages': 0, 'items': 0, 'seconds': 0})
+            counts['pages'] += 1
+            counts['items'] += items
+            counts['seconds'] += seconds
+        self.emit('page', iterator=iterator, items=items, seconds=seconds)
+
+    def snapshot(self):
+        """
+        Get a copy of the counts
+
+        :return: A dictionary of the counts
+        """
+
+        with self.lock:
+            endpoints = [{'api': api, 'endpoint': endpoint, **counts,
+                          'statuses': dict(counts['statuses'])}
+                         for (api, endpoint), counts in self.endpoints.items()]
+            iterators = [{'iterator': name, **counts,
+                          'items_per_second': counts['items'] /
+                          counts['seconds'] if counts['seconds'] else 0}
+                         for name, counts in self.iterators.items()]
+            return {'seconds': time() - self.started,
+                    'endpoints': endpoints,
+                    'waits': dict(self.waits),
+                    'decode_seconds': self.decode_seconds,
+                    'iterators': iterators}
+
+    def to_json(self, indent=None):
+        return codec.dumps(self.snapshot(), indent=indent)
+
+    def to_prometheus(self, prefix='socialreaper'):
+        """
+        Export the counts in the Prometheus text format
+
+        :param prefix: The prefix of the metric names
+        :return: The text
+        """
+
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name, kind, samples):
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+            for labels, value in samples:
+                label_text = ",".join(
+                    '%s="%s"' % (key, str(label).replace('\\', '\\\\')
+                                 .replace('"', '\\"'))
+                    for key, label in labels)
+                if label_text:
+                    label_text = "{%s}" % label_text
+                lines.append("%s_%s%s %s" % (prefix, name, label_text, value))
+
+        endpoints = snapshot['endpoints']
+        for name, key in (('requests_total', 'requests'),
+                          ('request_errors_total', 'errors'),
+                          ('request_retries_total', 'retries'),
+                          ('request_seconds_total', 'seconds'),
+                          ('response_bytes_total', 'bytes')):
+            metric(name, 'counter', [
+                ((('api', e['api']), ('endpoint', e['endpoint'])), e[key])
+                for e in endpoints])
+
+        metric('responses_total', 'counter', [
+            ((('api', e['api']), ('endpoint', e['endpoint']),
+              ('status', status)), count)
+            for e in endpoints for status, count in e['statuses'].items()])
+
+        metric('wait_seconds_total', 'counter', [
+            ((('reason', reason),), seconds)
+            for reason, seconds in snapshot['waits'].items()])
+
+        metric('decode_seconds_total', 'counter',
+               [((), snapshot['decode_seconds'])])
+
+        for name, key in (('iterator_pages_total', 'pages'),
+                          ('iterator_items_total', 'items'),
+                          ('iterator_seconds_total', 'seconds')):
+            metric(name, 'counter', [
+                ((('iterator', i['iterator']),), i[key])
+                for i in snapshot['iterators']])
+
+        return "\n".join(lines) + "\n"
+
+
+class JsonLinesHook:
+    def __init__(self, file_name='events.jsonl'):
+        """
+        A hook that writes each event to a json lines file, for tracing
+
+        :param file_name: The name of the file
+        """
+
+        self.file = open(file_name, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def __call__(self, event, details):
+        line = codec.dumps({'time': time(), 'event': event, **details})
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+# The metrics api objects and iterators record to unless given others
+default_metrics = Metrics()
@@ -0,0 +1,415 @@
+import csv
+import sqlite3
+import threading
+import warnings
+from queue import Empty, Full, Queue
+from time import time
+
+from . import codec
+from .dedup import Deduplicator
+from .tools import flatten, get_path, send
+
+
+class CSVSink:
+    def __init__(self, file_name='data.csv', field_names=None, flat=True,
+                 encoding='utf-8'):
+        """
+        Write items to a csv file as they arrive. The columns are the given
+        field names, or the keys of the first batch. Keys outside the columns
+        are left out, with a warning the first time each is seen, so give the
+        field names when items arrive one at a time
+
+        :param file_name: The name of the file
+        :param field_names: The columns of the file
+        :param flat: Flatten the items before writing
+        :param encoding: The encoding of the file
+        """
+
+        self.file_name = file_name
+        self.field_names = field_names
+        self.flat = flat
+        self.encoding = encoding
+
+        self.file = None
+        self.writer = None
+
+        # Keys that have been left out of the file
+        self.dropped = set()
+
+    def _check_keys(self, items):
+        columns = set(self.field_names)
+        for item in items:
+            for key in item:
+                if key not in columns and key not in self.dropped:
+                    self.dropped.add(key)
+                    warnings.warn("%s is not a column of %s, it is left out"
+                                  % (key, self.file_name))
+
+    def write_batch(self, items):
+        if self.flat:
+            items = [flatten(item) for item in items]
+
+        if not self.writer:
+            if not self.field_names:
+                self.field_names = []
+                for item in items:
+                    for key in item:
+                        if key not in self.field_names:
+                            self.field_names.append(key)
+
+            self.file = open(self.file_name, 'w', encoding=self.encoding,
+                             errors='ignore', newline='')
+            self.writer = csv.DictWriter(self.file, self.field_names,
+                                         extrasaction='ignore',
+                                         lineterminator='\n')
+            self.writer.writeheader()
+
+        self._check_keys(items)
+        self.writer.writerows(items)
+
+    def write(self, item):
+        self.write_batch([item])
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+class JSONLSink:
+    def __init__(self, file_name='data.jsonl', append=False,
+                 encoding='utf-8'):
+        """
+        Write items to a json lines file as they arrive
+
+        :param file_name: The name of the file
+        :param append: Add to the file instead of replacing it
+        :param encoding: The encoding of the file
+        """
+
+        self.file_name = file_name
+        self.file = open(file_name, 'a' if append else 'w', encoding=encoding)
+
+    def write_batch(self, items):
+        self.file.write(''.join(codec.dumps(item) + '\n'
+                                for item in items))
+
+    def write(self, item):
+        self.write_batch([item])
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink:
+    def __init__(self, file_name='data.db', table='items', key=None):
+        """
+        Write items to an SQLite table as json, one transaction per batch
+
+        :param file_name: The database file
+        :param table: The name of the table
+        :param key: The flattened key of each item's id. Items with an id
+        already in the table replace it
+        """
+
+        self.file_name = file_name
+        self.table = table
+        self.key = key
+
+        # Connected on first write, from the thread that writes
+        self.connection = None
+
+    def _connect(self):
+        # Writes may come from different threads, eg. a Scheduler's workers,
+        # which take turns through a lock
+        self.connection = sqlite3.connect(self.file_name,
+                                          check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS "%s" '
+            '(id TEXT PRIMARY KEY, data TEXT)' % self.table)
+
+    def write_batch(self, items):
+        if not self.connection:
+            self._connect()
+
+        rows = [(str(get_path(item, self.key)) if self.key else None,
+                 codec.dumps(item)) for item in items]
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO "%s" (id, data) VALUES (?, ?)'
+                % self.table, rows)
+
+    def write(self, item):
+        self.write_batch([item])
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+
+class Stage:
+    def __init__(self, name, function, close=None):
+        """
+        A step of a pipeline, run on a batch of items at a time
+
+        :param name: The name of the stage
+        :param function: A function that takes and returns a list of items
+        :param close: A function called when the pipeline finishes
+        """
+
+        self.name = name
+        self.function = function
+        self.close = close
+
+        # Items in and out, seconds spent working and waiting for input
+        self.items_in = 0
+        self.items_out = 0
+        self.seconds = 0
+        self.waiting = 0
+
+    def __call__(self, batch):
+        start = time()
+        result = self.function(batch)
+        self.seconds += time() - start
+        self.items_in += len(batch)
+        self.items_out += len(result)
+        return result
+
+    def stats(self):
+        return {'stage': self.name, 'items_in': self.items_in,
+                'items_out': self.items_out, 'seconds': self.seconds,
+                'waiting': self.waiting}
+
+
+class Pipeline:
+    def __init__(self, source, batch_size=100, queue_size=10):
+        """
+        Stream items from an iterator through stages into sinks. Each stage
+        runs in its own thread, with bounded queues between them, so a slow
+        sink holds back the crawl and memory stays constant
+
+        :param source: The iterator, eg. an Iter
+        :param batch_size: Items passed between stages at once
+        :param queue_size: Batches queued between stages
+        """
+
+        self.source = source
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+        self.stages = []
+        self.sinks = []
+
+        # Time spent getting items from the source, and writing to sinks
+        self.source_stage = Stage('source', None)
+        self.sink_stage = Stage('sinks', None)
+
+        self.error = None
+        self.stopped = threading.Event()
+
+    def add(self, name, function, close=None):
+        """
+        Add a stage
+
+        :param name: The name of the stage
+        :param function: A function that takes and returns a list of items
+        :param close: A function called when the pipeline finishes
+        :return: The pipeline
+        """
+
+        self.stages.append(Stage(name, function, close))
+        return self
+
+    def filter(self, predicate):
+        return self.add('filter', lambda batch: [
+            item for item in batch if predicate(item)])
+
+    def map(self, function):
+        return self.add('map', lambda batch: [
+            function(item) for item in batch])
+
+    def project(self, *fields):
+        """
+        Keep only some fields of each item
+
+        :param fields: Flattened keys, eg. 'snippet.title'
+        :return: The pipeline
+        """
+
+        return self.add('project', lambda batch: [
+            {field: get_path(item, field) for field in fields}
+            for item in batch])
+
+    def flatten(self):
+        return self.add('flatten', lambda batch: [
+            flatten(item) for item in batch])
+
+    def dedup(self, key='id', deduplicator=None, **kwargs):
+        """
+        Drop items whose id has already been seen. Put it before costly
+        stages, so repeats are dropped early
+
+        :param key: The flattened key of each item's id
+        :param deduplicator: A Deduplicator, eg. one shared with other
+        pipelines
+        :param kwargs: Deduplicator options, eg. threshold, error_rate and a
+        file_name to skip items stored by earlier runs
+        :return: The pipeline
+        """
+
+        if not deduplicator:
+            deduplicator = Deduplicator(key, **kwargs)
+        return self.add('dedup', deduplicator.filter_batch,
+                        deduplicator.close)
+
+    def to(self, *sinks):
+        """
+        Add sinks. A sink is a list, a function, or an object with a
+        write or write_batch method
+
+        :return: The pipeline
+        """
+
+        self.sinks.extend(sinks)
+        return self
+
+    def _put(self, queue, batch):
+        while not self.stopped.is_set():
+            try:
+                queue.put(batch, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _get(self, queue, stage):
+        start = time()
+        while not self.stopped.is_set():
+            try:
+                batch = queue.get(timeout=0.1)
+                stage.waiting += time() - start
+                return batch
+            except Empty:
+                continue
+
+    def _read(self, output):
+        stage = self.source_stage
+        try:
+            batch = []
+            start = time()
+            for item in self.source:
+                if self.stopped.is_set():
+                    return
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    stage.seconds += time() - start
+                    stage.items_out += len(batch)
+                    self._put(output, batch)
+                    batch = []
+                    start = time()
+            stage.seconds += time() - start
+            stage.items_out += len(batch)
+            if batch:
+                self._put(output, batch)
+        except Exception as e:
+            self.fail(e)
+        self._put(output, None)
+
+    def _run_stage(self, stage, source, output):
+        try:
+            while True:
+                batch = self._get(source, stage)
+                if batch is None:
+                    break
+                batch = stage(batch)
+                if batch:
+                    self._put(output, batch)
+        except Exception as e:
+            self.fail(e)
+        self._put(output, None)
+
+    def _write(self, batch):
+        for sink in self.sinks:
+            if hasattr(sink, 'write_batch'):
+                sink.write_batch(batch)
+            else:
+                for item in batch:
+                    send(sink, item)
+        return batch
+
+    def fail(self, error):
+        if not self.error:
+            self.error = error
+        self.stopped.set()
+
+    def stop(self):
+        """
+        Stop reading from the source, leaving queued items unwritten
+
+        :return: None
+        """
+
+        self.stopped.set()
+
+    def run(self):
+        """
+        Run the pipeline until the source is exhausted
+
+        :return: The stats of each stage
+        """
+
+        self.sink_stage.function = self._write
+        queues = [Queue(maxsize=self.queue_size)
+                  for _ in range(len(self.stages) + 1)]
+
+        threads = [threading.Thread(target=self._read, args=(queues[0],),
+                                    daemon=True)]
+        for i, stage in enumerate(self.stages):
+            threads.append(threading.Thread(
+                target=self._run_stage, args=(stage, queues[i], queues[i + 1]),
+                daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                batch = self._get(queues[-1], self.sink_stage)
+                if batch is None:
+                    break
+                self.sink_stage(batch)
+        except Exception as e:
+            self.fail(e)
+        finally:
+            self.stopped.set()
+            for thread in threads:
+                thread.join()
+            for stage in self.stages:
+                if stage.close:
+                    stage.close()
+            for sink in self.sinks:
+                if hasattr(sink, 'close'):
+                    sink.close()
+                elif hasattr(sink, 'flush'):
+                    sink.flush()
+
+        if self.error:
+            raise self.error
+        return self.stats()
+
+    def stats(self):
+        """
+        Get the items and time of each stage
+
+        :return: A list of dictionaries, one for each stage
+        """
+
+        return [stage.stats() for stage in
+                [self.source_stage] + self.stages + [self.sink_stage]]
@@ -0,0 +1,250 @@
+import threading
+from time import time
+
+from . import codec
+from .exceptions import ApiError, NoCredentialsError, QuotaExceededError
+
+
+class CredentialPool:
+    """
+    Api objects for the same platform, each with its own key. Requests are
+    spread between the keys, and keys that are refused or out of quota are
+    quarantined for a while
+    """
+
+    # Statuses that mean a key was refused or has been rate limited. Other
+    # statuses, such as a 403 for comments that are turned off, are about
+    # the request and are raised without changing key
+    key_statuses = (401, 429)
+
+    # Reasons in an error body that mean the key is out of quota or rate
+    # limited, eg. YouTube's quotaExceeded, and Facebook's rate limit codes
+    key_reasons = ('quotaExceeded', 'rateLimitExceeded', 'dailyLimitExceeded',
+                   'userRateLimitExceeded', 4, 17, 32, 613)
+
+    def __init__(self, apis, strategy='round_robin', quarantine=900):
+        self.apis = []
+        self.stats = []
+
+        # 'round_robin', or 'least_limited' to prefer keys limited longest ago
+        self.strategy = strategy
+
+        # Seconds a refused key is left unused
+        self.quarantine = quarantine
+
+        self.i = 0
+        self.lock = threading.Lock()
+
+        for api in apis:
+            self.add(api)
+
+    def add(self, api):
+        """
+        Add an api object to the pool
+
+        :param api: The api object
+        :return: None
+        """
+
+        with self.lock:
+            self.apis.append(api)
+            self.stats.append({'requests': 0, 'errors': 0, 'limited': 0,
+                               'last_limited': 0, 'quarantined_until': 0})
+
+    def acquire(self):
+        """
+        Choose the api object to make the next request with
+
+        :return: The index of the api object, and the api object
+        """
+
+        with self.lock:
+            now = time()
+            available = [i for i, stats in enumerate(self.stats)
+                         if stats['quarantined_until'] <= now]
+            if not available:
+                raise NoCredentialsError(
+                    "All %s keys are quarantined" % len(self.apis))
+
+            if self.strategy == 'least_limited':
+                index = min(available,
+                            key=lambda i: (self.stats[i]['last_limited'],
+                                           self.stats[i]['requests']))
+            else:
+                index = min(available,
+                            key=lambda i: (i - self.i) % len(self.apis))
+                self.i = index + 1
+
+            self.stats[index]['requests'] += 1
+            return index, self.apis[index]
+
+    def is_key_error(self, error):
+        """
+        Check if an error was caused by the key rather than the request
+
+        :param error: The ApiError
+        :return: True if the key should be quarantined
+        """
+
+        if isinstance(error, QuotaExceededError):
+            return True
+        response = getattr(error.error, 'response', None)
+        if getattr(response, 'status_code', None) in self.key_statuses:
+            return True
+        return any(reason in self.key_reasons
+                   for reason in self.error_reasons(response))
+
+    @staticmethod
+    def error_reasons(response):
+        """
+        Read the reasons and codes from an error response's body
+
+        :param response: The response, or None
+        :return: A list of reasons and codes
+        """
+
+        try:
+            error = codec.loads(response.content).get('error')
+        except Exception:
+            return []
+        if not isinstance(error, dict):
+            return []
+
+        reasons = [error.get('code')]
+        for detail in error.get('errors') or []:
+            if isinstance(detail, dict):
+                reasons.append(detail.get('reason'))
+        return reasons
+
+    def report(self, index, error):
+        """
+        Record a failed request
+
+        :param index: The index of the api object that made the request
+        :param error: The ApiError raised
+        :return: True if the key was quarantined
+        """
+
+        with self.lock:
+            stats = self.stats[index]
+            stats['errors'] += 1
+            if not self.is_key_error(error):
+                return False
+
+            stats['limited'] += 1
+            stats['last_limited'] = time()
+            stats['quarantined_until'] = time() + self.quarantine
+            return True
+
+    def call(self, name, *args, **kwargs):
+        """
+        Call an api method with the next key, moving on to another key if it
+        is refused
+
+        :param name: The name of the api method
+        :return: The method's return value
+        """
+
+        while True:
+            index, api = self.acquire()
+            try:
+                return getattr(api, name)(*args, **kwargs)
+            except ApiError as e:
+                if not self.report(index, e):
+                    raise
+
+    def health(self):
+        """
+        Get the state of each key
+
+        :return: A list of dictionaries, one for each key
+        """
+
+        now = time()
+        with self.lock:
+            return [{**stats, 'healthy': stats['quarantined_until'] <= now}
+                    for stats in self.stats]
+
+
+class Broadcast:
+    """
+    A dictionary, list or set attribute of every api object in a pool, so
+    that changing it changes them all. It is read from the first
+    """
+
+    def __init__(self, values):
+        # Each object once, in case api objects share one
+        self.values = list({id(value): value for value in values}.values())
+
+    def __getattr__(self, name):
+        attribute = getattr(self.values[0], name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return [getattr(value, name)(*args, **kwargs)
+                    for value in self.values][0]
+
+        return call
+
+    def __getitem__(self, key):
+        return self.values[0][key]
+
+    def __setitem__(self, key, value):
+        for values in self.values:
+            values[key] = value
+
+    def __delitem__(self, key):
+        for values in self.values:
+            del values[key]
+
+    def __contains__(self, key):
+        return key in self.values[0]
+
+    def __iter__(self):
+        return iter(self.values[0])
+
+    def __len__(self):
+        return len(self.values[0])
+
+    def __repr__(self):
+        return repr(self.values[0])
+
+
+class PooledApi:
+    """
+    Stands in for an api object, making each request through a credential
+    pool. Attributes set on it, and control methods such as stop, apply to
+    every api object in the pool
+    """
+
+    # Methods called on every api object rather than with the next key.
+    # Private methods are too
+    control_methods = ('stop', 'resume', 'log_error')
+
+    def __init__(self, pool):
+        object.__setattr__(self, 'pool', pool)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.pool.apis[0], name)
+        if not callable(attribute):
+            if isinstance(attribute, (dict, list, set)):
+                return Broadcast([getattr(api, name)
+                                  for api in self.pool.apis])
+            return attribute
+
+        if name in self.control_methods or name.startswith('_'):
+            def control(*args, **kwargs):
+                return [getattr(api, name)(*args, **kwargs)
+                        for api in self.pool.apis][0]
+
+            return control
+
+        def call(*args, **kwargs):
+            return self.pool.call(name, *args, **kwargs)
+
+        return call
+
+    def __setattr__(self, name, value):
+        for api in self.pool.apis:
+            setattr(api, name, value)
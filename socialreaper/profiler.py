@@ -0,0 +1,245 @@
+import sys
+import threading
+from os import path
+from time import time
+
+from .tools import send
+
+# Functions that mark the phase a thread is in. The innermost match on a
+# thread's stack decides its phase
+phase_functions = {
+    ('apis', '_rate_limit'): 'wait',
+    ('apis', '_sleep'): 'wait',
+    ('apis', 'decode'): 'decode',
+    ('codec', 'loads'): 'decode',
+    ('codec', 'dumps'): 'write',
+    ('apis', 'get'): 'fetch',
+    ('tools', 'flatten'): 'transform',
+    ('tools', 'fill_gaps'): 'transform',
+    ('tools', 'get_path'): 'transform',
+    ('iterators', 'project'): 'transform',
+    ('pipeline', '__call__'): 'transform',
+    ('tools', 'send'): 'write',
+    ('tools', 'write'): 'write',
+    ('tools', 'to_csv'): 'write',
+    ('tools', 'to_json'): 'write',
+    ('pipeline', 'write'): 'write',
+    ('pipeline', 'write_batch'): 'write',
+    ('pipeline', '_write'): 'write',
+    ('iterators', 'get_data'): 'parse',
+    ('iterators', 'get_page'): 'parse',
+    ('iterators', '_read_response'): 'parse',
+    ('iterators', '_next_params'): 'parse',
+    ('iterators', '_get_after'): 'parse',
+    ('iterators', '_walk'): 'parse',
+    ('iterators', '_walk_replies'): 'parse',
+}
+
+# Modules whose every function belongs to a phase
+phase_modules = {
+    'transform': 'transform',
+}
+
+# Functions a thread sits in while it has nothing to do
+idle_functions = {'wait', 'get', 'join', 'acquire', 'select', 'poll',
+                  '_worker', 'result'}
+
+package_dir = path.dirname(path.abspath(__file__))
+
+
+def _module(code):
+    file_name = code.co_filename
+    if path.dirname(path.abspath(file_name)) != package_dir:
+        return None
+    return path.splitext(path.basename(file_name))[0]
+
+
+def _label(frame):
+    code = frame.f_code
+    module = _module(code)
+    if not module:
+        module = path.splitext(path.basename(code.co_filename))[0]
+    return "%s:%s" % (module, code.co_name)
+
+
+class Profiler:
+    def __init__(self, interval=0.005, collapsed_file=None):
+        """
+        Sample the stacks of every thread while a crawl runs, attributing
+        time to phases: fetch, wait, decode, parse, transform and write.
+        Use as a context manager, or call start and stop
+
+        :param interval: Seconds between samples
+        :param collapsed_file: A file to write the sampled stacks to, in the
+        collapsed format flamegraph tools read
+        """
+
+        self.interval = interval
+        self.collapsed_file = collapsed_file
+
+        # Samples counted by phase, and by phase and stack
+        self.phases = {}
+        self.stacks = {}
+        self.samples = 0
+
+        # Seconds attributed to each phase, measured between samples, as
+        # sampling many threads can take longer than the interval
+        self.seconds = {}
+
+        self.started = None
+        self.finished = None
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def classify(self, frame):
+        """
+        Find the phase of a stack
+
+        :param frame: The innermost frame of the stack
+        :return: The phase
+        """
+
+        leaf = frame
+        while frame:
+            module = _module(frame.f_code)
+            if module:
+                phase = phase_functions.get((module, frame.f_code.co_name),
+                                            phase_modules.get(module))
+                if phase:
+                    return phase
+            frame = frame.f_back
+
+        if leaf.f_code.co_name in idle_functions:
+            return 'idle'
+        return 'other'
+
+    def sample(self, elapsed=None):
+        """
+        Sample the stack of every thread
+
+        :param elapsed: Seconds since the last sample, each thread's phase
+        is given them. Defaults to the interval
+        :return: None
+        """
+
+        if elapsed is None:
+            elapsed = self.interval
+
+        me = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+
+            phase = self.classify(frame)
+            self.phases[phase] = self.phases.get(phase, 0) + 1
+            self.seconds[phase] = self.seconds.get(phase, 0) + elapsed
+            self.samples += 1
+
+            if self.collapsed_file:
+                labels = []
+                while frame:
+                    labels.append(_label(frame))
+                    frame = frame.f_back
+                stack = ";".join([phase] + labels[::-1])
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def _run(self):
+        last = time()
+        while not self.stopped.wait(self.interval):
+            now = time()
+            self.sample(now - last)
+            last = now
+
+    def start(self):
+        self.started = time()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop sampling, and write the collapsed stacks if a file was given
+
+        :return: None
+        """
+
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+        self.finished = time()
+
+        if self.collapsed_file:
+            self.write_collapsed(self.collapsed_file)
+
+    def summary(self):
+        """
+        Get the time attributed to each phase. Seconds are summed over
+        threads, so they can add up to more than the run took
+
+        :return: A dictionary of the run's length, and seconds and share of
+        samples for each phase
+        """
+
+        finished = self.finished if self.finished else time()
+        return {'seconds': finished - self.started if self.started else 0,
+                'samples': self.samples,
+                'phases': {phase: {'seconds': self.seconds[phase],
+                                   'share': count / self.samples}
+                           for phase, count in sorted(
+                               self.phases.items(),
+                               key=lambda item: -item[1])}}
+
+    def report(self):
+        """
+        Format the summary as a table
+
+        :return: The text of the table
+        """
+
+        summary = self.summary()
+        lines = ["%.1f seconds, %s samples" % (summary['seconds'],
+                                               summary['samples'])]
+        for phase, counts in summary['phases'].items():
+            lines.append("%-10s %8.2fs %6.1f%%" % (
+                phase, counts['seconds'], counts['share'] * 100))
+        return "\n".join(lines)
+
+    def write_collapsed(self, file_name):
+        """
+        Write the sampled stacks in the collapsed format, one stack and its
+        count per line
+
+        :param file_name: The name of the file
+        :return: None
+        """
+
+        with open(file_name, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.items():
+                f.write("%s %s\n" % (stack, count))
+
+
+def profile(iterable, *sinks, **kwargs):
+    """
+    Consume an iterable into sinks while profiling
+
+    :param iterable: The items, eg. an Iter or a ProcessTransform
+    :param sinks: Where items are sent, eg. a list or a JSONLSink
+    :param kwargs: interval and collapsed_file options
+    :return: The Profiler
+    """
+
+    with Profiler(**kwargs) as profiler:
+        for item in iterable:
+            for sink in sinks:
+                send(sink, item)
+        for sink in sinks:
+            if hasattr(sink, 'flush'):
+                sink.flush()
+    return profiler
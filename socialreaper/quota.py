@@ -0,0 +1,224 @@
+import json
+import threading
+from datetime import datetime, timedelta
+from os import path
+
+from .exceptions import QuotaExceededError
+
+try:
+    from zoneinfo import ZoneInfo
+    PACIFIC = ZoneInfo('America/Los_Angeles')
+except (ImportError, KeyError):
+    # Before Python 3.9, or without time zone data
+    PACIFIC = None
+
+
+def pacific_date():
+    """
+    Get today's date in Pacific Time, when YouTube quotas reset
+
+    :return: The date, eg. '2020-03-08'
+    """
+
+    if PACIFIC:
+        return datetime.now(PACIFIC).strftime('%Y-%m-%d')
+
+    # Daylight time runs from 2am on the second Sunday of March to 2am on
+    # the first Sunday of November, local time
+    now = datetime.utcnow()
+    march = datetime(now.year, 3, 8)
+    november = datetime(now.year, 11, 1)
+    start = march + timedelta(days=(6 - march.weekday()) % 7, hours=10)
+    end = november + timedelta(days=(6 - november.weekday()) % 7, hours=9)
+    offset = 7 if start <= now < end else 8
+    return (now - timedelta(hours=offset)).strftime('%Y-%m-%d')
+
+
+class QuotaLedger:
+    """
+    Keeps count of the quota units spent each day, optionally in a json file
+    so that the count is kept between runs
+    """
+
+    def __init__(self, limit=10000, file_name=None):
+        # Units that can be spent in a day, None to count without a limit
+        self.limit = limit
+
+        self.file_name = file_name
+        self.date = None
+        self.spent = 0
+        self.lock = threading.Lock()
+
+        self._load()
+
+    @staticmethod
+    def today():
+        # Quotas reset at midnight Pacific Time
+        return pacific_date()
+
+    def _load(self):
+        self.date = self.today()
+        self.spent = 0
+
+        if self.file_name and path.isfile(self.file_name):
+            with open(self.file_name, 'r', encoding='utf-8') as f:
+                ledger = json.load(f)
+            if ledger.get('date') == self.date:
+                self.spent = ledger.get('spent', 0)
+
+    def _save(self):
+        if self.file_name:
+            with open(self.file_name, 'w', encoding='utf-8') as f:
+                json.dump({'date': self.date, 'spent': self.spent}, f)
+
+    def _roll_over(self):
+        if self.date != self.today():
+            self._load()
+
+    def remaining(self):
+        """
+        Get the number of units left for the day
+
+        :return: The number of units, None if there is no limit
+        """
+
+        with self.lock:
+            self._roll_over()
+            if self.limit is None:
+                return None
+            return self.limit - self.spent
+
+    def can_spend(self, units):
+        remaining = self.remaining()
+        return remaining is None or remaining >= units
+
+    def spend(self, units, edge=None):
+        """
+        Record units being spent on a request
+
+        :param units: The cost of the request
+        :param edge: The endpoint being requested
+        :return: None
+        """
+
+        with self.lock:
+            self._roll_over()
+            if self.limit is not None and self.spent + units > self.limit:
+                raise QuotaExceededError(
+                    "%s needs %s quota units, %s of %s remain" % (
+                        edge, units, self.limit - self.spent, self.limit))
+
+            self.spent += units
+            self._save()
+
+
+# Ledgers shared by the api objects of each key
+ledgers = {}
+ledgers_lock = threading.Lock()
+
+
+def shared_ledger(key):
+    """
+    Get the ledger shared by every api object using a key. It counts the
+    units spent without a limit, pass a QuotaLedger to the api to enforce one
+
+    :param key: The api key
+    :return: The QuotaLedger
+    """
+
+    with ledgers_lock:
+        if key not in ledgers:
+            ledgers[key] = QuotaLedger(limit=None)
+        return ledgers[key]
+
+
+class QuotaScheduler:
+    """
+    Runs crawls on a source that charges quota, most items per unit first.
+    Crawls that would exceed the remaining quota are deferred
+    """
+
+    # The endpoint each method pages through, and the items it gets per page
+    method_costs = {
+        'search': ('search', 50),
+        'search_comments': ('search', 50),
+        'channel': ('playlistItems', 50),
+        'channel_search': ('search', 50),
+        'channel_comments': ('playlistItems', 50),
+        'playlist': ('playlistItems', 50),
+        'video': ('videos', 1),
+        'videos': ('videos', 50),
+        'video_comments': ('commentThreads', 50),
+        'thread_replies': ('comments', 100),
+    }
+
+    def __init__(self, source):
+        self.source = source
+        self.api = source.api
+
+        # Crawls waiting to run, and crawls deferred until there is quota
+        self.jobs = []
+        self.deferred = []
+
+        # The crawl being run
+        self.current = None
+
+    def _page_cost(self, method):
+        edge, _ = self.method_costs.get(method, (method, 1))
+        return self.api.quota_costs.get(edge, 1)
+
+    def add(self, method, *args, items_per_unit=None, **kwargs):
+        """
+        Add a crawl to be run
+
+        :param method: The name of the source's method
+        :param args: The method's arguments
+        :param items_per_unit: Estimated items per quota unit, used for ordering
+        :param kwargs: The method's keyword arguments
+        :return: None
+        """
+
+        if items_per_unit is None:
+            _, items = self.method_costs.get(method, (method, 1))
+            items_per_unit = items / self._page_cost(method)
+
+        self.jobs.append({'method': method, 'args': args, 'kwargs': kwargs,
+                          'items_per_unit': items_per_unit, 'iter': None})
+
+    def resume(self):
+        """
+        Move the deferred crawls back to be run
+
+        :return: None
+        """
+
+        self.jobs.extend(self.deferred)
+        self.deferred = []
+
+    def __iter__(self):
+        self.jobs.sort(key=lambda job: job['items_per_unit'], reverse=True)
+
+        while self.jobs:
+            job = self.jobs.pop(0)
+            self.current = job
+
+            if not self.api.quota.can_spend(self._page_cost(job['method'])):
+                self.deferred.append(job)
+                continue
+
+            if not job['iter']:
+                function = getattr(self.source, job['method'])
+                job['iter'] = function(*job['args'], **job['kwargs'])
+
+            try:
+                for item in job['iter']:
+                    yield item
+            except Exception as e:
+                # Iterators wrap api errors in an IterError
+                if not isinstance(e, QuotaExceededError) and \
+                        not isinstance(getattr(e, 'error', None),
+                                       QuotaExceededError):
+                    raise
+                self.deferred.append(job)
+
+        self.current = None
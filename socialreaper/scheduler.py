@@ -0,0 +1,234 @@
+import threading
+from time import time
+
+from .tools import send
+
+
+class Job:
+    def __init__(self, source, method, *args, priority=0, sinks=None,
+                 name=None, **kwargs):
+        """
+        A crawl made by calling a method of a source
+
+        :param source: The source, eg. a Reddit or YouTube object
+        :param method: The name of the source's method, eg. 'subreddit'
+        :param args: The method's arguments
+        :param priority: Jobs with a higher priority are started first
+        :param sinks: Where the job's items are sent, instead of the
+        scheduler's sinks
+        :param name: A name for the job
+        :param kwargs: The method's keyword arguments
+        """
+
+        self.source = source
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.sinks = sinks
+        self.name = name if name else "%s.%s%s" % (
+            type(source).__name__, method, args)
+
+        # Platform the job counts against for concurrency and fairness
+        self.platform = type(source).__name__
+
+        self.status = 'pending'
+        self.items = 0
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    def __repr__(self):
+        return "<Job %s %s, %s items>" % (self.name, self.status, self.items)
+
+    def iterator(self):
+        return getattr(self.source, self.method)(*self.args, **self.kwargs)
+
+
+class Scheduler:
+    def __init__(self, workers=4, limits=None, weights=None, sinks=None,
+                 default_limit=None):
+        """
+        Run many crawls at once on a pool of worker threads
+
+        :param workers: The number of jobs run at once
+        :param limits: The most jobs run at once for each platform, eg.
+        {'YouTube': 2}
+        :param weights: Each platform's share of job starts, eg.
+        {'Reddit': 2, 'YouTube': 1}. Platforms default to 1
+        :param sinks: Where items are sent. A sink is a list, a function, or
+        an object with a write method
+        :param default_limit: The most jobs run at once for other platforms
+        """
+
+        self.workers = workers
+        self.limits = limits if limits else {}
+        self.weights = weights if weights else {}
+        self.sinks = sinks if sinks else []
+        self.default_limit = default_limit
+
+        self.pending = []
+        self.jobs = []
+
+        # Jobs running on each platform, and the weighted starts of each
+        # platform, used to share the workers fairly
+        self.running = {}
+        self.starts = {}
+
+        self.condition = threading.Condition()
+        self.sink_locks = {}
+        self.stopped = threading.Event()
+
+        # Api objects stopped by stop, resumed when the run ends
+        self.stopped_apis = []
+
+    def add(self, source, method, *args, **kwargs):
+        """
+        Add a crawl
+
+        :param source: The source, eg. a Reddit or YouTube object
+        :param method: The name of the source's method
+        :return: The Job
+        """
+
+        job = Job(source, method, *args, **kwargs)
+        with self.condition:
+            self.pending.append(job)
+            self.jobs.append(job)
+            self.condition.notify()
+        return job
+
+    def _limit(self, platform):
+        return self.limits.get(platform, self.default_limit)
+
+    def _next_job(self):
+        """
+        Choose the highest priority job that its platform has room for,
+        breaking ties with the platform that has had the least share
+
+        :return: The job, or None
+        """
+
+        available = []
+        for job in self.pending:
+            limit = self._limit(job.platform)
+            if limit is None or self.running.get(job.platform, 0) < limit:
+                available.append(job)
+
+        if not available:
+            return None
+
+        job = min(available,
+                  key=lambda job: (-job.priority,
+                                   self.starts.get(job.platform, 0)))
+        self.pending.remove(job)
+
+        self.running[job.platform] = self.running.get(job.platform, 0) + 1
+        self.starts[job.platform] = self.starts.get(job.platform, 0) + \
+            1 / self.weights.get(job.platform, 1)
+        return job
+
+    def _write(self, sink, item):
+        with self.condition:
+            lock = self.sink_locks.setdefault(id(sink), threading.Lock())
+
+        with lock:
+            send(sink, item)
+
+    def _run_job(self, job):
+        job.status = 'running'
+        job.started = time()
+        sinks = job.sinks if job.sinks is not None else self.sinks
+
+        try:
+            for item in job.iterator():
+                for sink in sinks:
+                    self._write(sink, item)
+                job.items += 1
+
+                if self.stopped.is_set():
+                    break
+            job.status = 'stopped' if self.stopped.is_set() else 'done'
+        except Exception as e:
+            job.status = 'stopped' if self.stopped.is_set() else 'failed'
+            job.error = e
+
+        job.finished = time()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                job = None
+                while not self.stopped.is_set():
+                    job = self._next_job()
+                    if job or not self.pending:
+                        break
+                    self.condition.wait()
+
+                if not job:
+                    return
+
+            try:
+                self._run_job(job)
+            finally:
+                with self.condition:
+                    self.running[job.platform] -= 1
+                    self.condition.notify_all()
+
+    def run(self):
+        """
+        Run the jobs until they have all finished
+
+        :return: The list of jobs
+        """
+
+        threads = [threading.Thread(target=self._work, daemon=True)
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Let the api objects be used again after the run
+        for api in self.stopped_apis:
+            api.resume()
+        self.stopped_apis = []
+
+        for sink in self.sinks:
+            if hasattr(sink, 'flush'):
+                sink.flush()
+
+        return self.jobs
+
+    def stop(self):
+        """
+        Stop starting jobs, and stop running jobs after their current item
+        or wait
+
+        :return: None
+        """
+
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+
+        # Cut short the rate limit and retry waits of running jobs
+        for job in self.jobs:
+            api = getattr(job.source, 'api', None)
+            if job.status == 'running' and hasattr(api, 'stop'):
+                api.stop()
+                self.stopped_apis.append(api)
+
+    def summary(self):
+        """
+        Get the state of each job
+
+        :return: A list of dictionaries, one for each job
+        """
+
+        return [{'name': job.name, 'platform': job.platform,
+                 'status': job.status, 'items': job.items,
+                 'error': str(job.error) if job.error else None,
+                 'seconds': (job.finished if job.finished else time()) -
+                 job.started if job.started else 0}
+                for job in self.jobs]
@@ -0,0 +1,142 @@
+import json
+import threading
+from contextlib import contextmanager
+from os import O_CREAT, O_EXCL, O_TRUNC, O_WRONLY, close, open as os_open, \
+    path, remove, replace
+from time import time, sleep
+
+
+class TokenStore:
+    """
+    Holds access tokens so they can be shared between api objects. Only one
+    refresh of a token happens at a time
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.locks = {}
+        self.guard = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a stored token
+
+        :param key: The key the token is stored under
+        :return: A tuple of the token and its expiry time, or None
+        """
+
+        token = self.tokens.get(key)
+        if token:
+            return token['access_token'], token['expiry']
+
+    def set(self, key, token, expiry):
+        """
+        Store a token
+
+        :param key: The key to store the token under
+        :param token: The access token
+        :param expiry: The time the token expires
+        :return: None
+        """
+
+        self.tokens[key] = {'access_token': token, 'expiry': expiry}
+
+    def discard(self, key):
+        """
+        Remove a token that is no longer accepted
+
+        :param key: The key the token is stored under
+        :return: None
+        """
+
+        self.tokens.pop(key, None)
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Hold the refresh lock for a key
+
+        :param key: The key being refreshed
+        """
+
+        with self.guard:
+            lock = self.locks.setdefault(key, threading.Lock())
+        with lock:
+            yield
+
+
+class FileTokenStore(TokenStore):
+    """
+    A token store kept in a json file, so tokens can be shared between
+    processes. A lock file next to it makes refreshes single flight across
+    processes
+    """
+
+    def __init__(self, file_name='tokens.json', lock_timeout=30):
+        super().__init__()
+
+        self.file_name = file_name
+        self.lock_name = file_name + '.lock'
+
+        # Seconds after which a lock file is considered abandoned
+        self.lock_timeout = lock_timeout
+
+    def _read(self):
+        if not path.isfile(self.file_name):
+            return {}
+        try:
+            with open(self.file_name, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _write(self, tokens):
+        temp_name = self.file_name + '.tmp'
+        descriptor = os_open(temp_name, O_CREAT | O_TRUNC | O_WRONLY,
+                             0o600)
+        with open(descriptor, 'w', encoding='utf-8') as f:
+            json.dump(tokens, f)
+        replace(temp_name, self.file_name)
+
+    def get(self, key):
+        self.tokens = self._read()
+        return super().get(key)
+
+    def set(self, key, token, expiry):
+        self.tokens = self._read()
+        super().set(key, token, expiry)
+        self._write(self.tokens)
+
+    def discard(self, key):
+        self.tokens = self._read()
+        super().discard(key)
+        self._write(self.tokens)
+
+    @contextmanager
+    def lock(self, key):
+        with super().lock(key):
+            while True:
+                try:
+                    close(os_open(self.lock_name, O_CREAT | O_EXCL))
+                    break
+                except FileExistsError:
+                    try:
+                        if time() - path.getmtime(self.lock_name) > \
+                                self.lock_timeout:
+                            remove(self.lock_name)
+                            continue
+                    except OSError:
+                        continue
+                    sleep(0.1)
+
+            try:
+                yield
+            finally:
+                try:
+                    remove(self.lock_name)
+                except OSError:
+                    pass
+
+
+# The store used when an api object isn't given one
+default_store = TokenStore()
@@ -1,8 +1,9 @@
 import requests
-import json
 import csv
 from os import path, makedirs
-import collections
+import collections.abc
+
+from . import codec
 
 
 def flatten(dictionary, parent_key=False, separator='.'):
@@ -18,7 +19,7 @@ def flatten(dictionary, parent_key=False, separator='.'):
     items = []
     for key, value in dictionary.items():
         new_key = str(parent_key) + separator + key if parent_key else key
-        if isinstance(value, collections.MutableMapping):
+        if isinstance(value, collections.abc.MutableMapping):
             items.extend(flatten(value, new_key, separator).items())
         elif isinstance(value, list):
             for k, v in enumerate(value):
@@ -28,6 +29,31 @@ def flatten(dictionary, parent_key=False, separator='.'):
     return dict(items)
 
 
+def get_path(dictionary, key_path, separator='.'):
+    """
+    Get a value from a nested dictionary by its flattened key
+
+    :param dictionary: The nested or flattened dictionary
+    :param key_path: The flattened key, eg. 'snippet.title' or 'data.0.id'
+    :param separator: The string used to separate flattened keys
+    :return: The value, or None
+    """
+
+    if key_path in dictionary:
+        return dictionary[key_path]
+
+    value = dictionary
+    for key in key_path.split(separator):
+        if isinstance(value, list) and key.isdigit() and \
+                int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, collections.abc.Mapping) and key in value:
+            value = value[key]
+        else:
+            return None
+    return value
+
+
 def fill_gaps(list_dicts):
     """
     Fill gaps in a list of dictionaries. Add empty keys to dictionaries in
@@ -204,8 +230,8 @@ def to_json(data, filename='data.json', indent=4):
     :return: None
     """
 
-    with open(filename, 'w') as f:
-        f.write(json.dumps(data, indent=indent))
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write(codec.dumps(data, indent=indent))
 
 
 def save_file(filename, source, folder="Downloads"):
@@ -230,3 +256,20 @@ def save_file(filename, source, folder="Downloads"):
 def iter_print(iterable):
     for item in iterable:
         print(item)
+
+
+def send(sink, item):
+    """
+    Send an item to a sink
+
+    :param sink: A list, a function, or an object with a write method
+    :param item: The item
+    :return: None
+    """
+
+    if isinstance(sink, list):
+        sink.append(item)
+    elif hasattr(sink, 'write'):
+        sink.write(item)
+    else:
+        sink(item)
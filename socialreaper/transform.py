@@ -0,0 +1,151 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from queue import Full, Queue
+
+from . import codec
+from .tools import flatten
+
+
+def serialize(record):
+    """
+    Encode a record as a line of json
+
+    :param record: The record
+    :return: The json string
+    """
+
+    return codec.dumps(record)
+
+
+def to_row(record, field_names):
+    """
+    Build a csv row from a flattened record. Use with functools.partial to
+    give the field names
+
+    :param record: The flattened record
+    :param field_names: The columns of the row
+    :return: A list of strings
+    """
+
+    return ['' if record.get(key) is None else str(record.get(key))
+            for key in field_names]
+
+
+def _apply(functions, batch):
+    results = []
+    for record in batch:
+        for function in functions:
+            record = function(record)
+            if record is None:
+                break
+        else:
+            results.append(record)
+    return results
+
+
+class ProcessTransform:
+    def __init__(self, iterable, *functions, processes=None, batch_size=500,
+                 prefetch=2):
+        """
+        Apply functions to the records of an iterable in a pool of
+        processes. Records are fetched in a thread and sent to the processes
+        in pickled batches, so fetching and transforming overlap. Records
+        come out in the order they went in
+
+        :param iterable: The records, eg. an Iter
+        :param functions: Picklable functions applied to each record in turn.
+        A function returning None drops the record. Defaults to flatten
+        :param processes: The number of processes, defaults to every core
+        :param batch_size: The number of records sent to a process at once
+        :param prefetch: Batches queued for each process
+        """
+
+        self.iterable = iterable
+        self.functions = functions if functions else (flatten,)
+        self.processes = processes if processes else cpu_count() or 1
+        self.batch_size = batch_size
+
+        # Futures of submitted batches, bounded so memory stays constant
+        self.batches = Queue(maxsize=self.processes * prefetch)
+
+        self.executor = None
+        self.thread = None
+        self.error = None
+        self.stopped = threading.Event()
+
+        self.results = iter([])
+
+    def __iter__(self):
+        return self
+
+    def _submit(self, batch):
+        future = self.executor.submit(_apply, self.functions, batch)
+        while not self.stopped.is_set():
+            try:
+                self.batches.put(future, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _fetch(self):
+        batch = []
+        try:
+            for record in self.iterable:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    if not self._submit(batch):
+                        return
+                    batch = []
+            if batch:
+                self._submit(batch)
+        except Exception as e:
+            self.error = e
+        self._submit_end()
+
+    def _submit_end(self):
+        while not self.stopped.is_set():
+            try:
+                self.batches.put(None, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _start(self):
+        self.executor = ProcessPoolExecutor(self.processes)
+        self.thread = threading.Thread(target=self._fetch, daemon=True)
+        self.thread.start()
+
+    def __next__(self):
+        if not self.thread:
+            self._start()
+        elif self.stopped.is_set():
+            raise StopIteration
+
+        while True:
+            try:
+                return next(self.results)
+            except StopIteration:
+                pass
+
+            future = self.batches.get()
+            if future is None:
+                self.close()
+                if self.error:
+                    raise self.error
+                raise StopIteration
+            self.results = iter(future.result())
+
+    def close(self):
+        """
+        Stop fetching and shut down the processes
+
+        :return: None
+        """
+
+        self.stopped.set()
+        while not self.batches.empty():
+            self.batches.get_nowait()
+        if self.executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,123 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from socialreaper.dedup import BloomFilter, Deduplicator, SQLiteSet
+
+
+def items(start, stop):
+    return [{'id': i, 'data': {'id': 'x%s' % i}} for i in range(start, stop)]
+
+
+class TestBloomFilter(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(i)
+        self.assertTrue(all(i in bloom for i in range(1000)))
+
+    def test_error_rate(self):
+        bloom = BloomFilter(5000, 0.01)
+        for i in range(5000):
+            bloom.add(i)
+        false_positives = sum(i in bloom for i in range(5000, 25000))
+        self.assertLess(false_positives / 20000, 0.02)
+        self.assertAlmostEqual(bloom.false_positive_rate(), 0.01, places=2)
+
+
+class TestDeduplicator(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def file(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_exact(self):
+        dedup = Deduplicator()
+        kept = list(dedup.filter(items(0, 10) + items(5, 15)))
+        self.assertEqual([item['id'] for item in kept], list(range(15)))
+        self.assertEqual(dedup.stats()['store'], 'set')
+
+    def test_threshold_to_bloom(self):
+        dedup = Deduplicator(threshold=100, capacity=1000)
+        self.assertEqual(len(list(dedup.filter(items(0, 100)))), 100)
+        self.assertIsInstance(dedup.seen, set)
+
+        dedup.check({'id': 100})
+        self.assertIsInstance(dedup.seen, BloomFilter)
+        self.assertEqual(list(dedup.filter(items(0, 101))), [])
+
+    def test_bloom_rolls_over_at_capacity(self):
+        dedup = Deduplicator(threshold=10, capacity=100, error_rate=0.01)
+        list(dedup.filter(items(0, 350)))
+
+        stats = dedup.stats()
+        self.assertGreater(stats['filters'], 2)
+        self.assertLess(stats['false_positive_rate'], 0.02)
+        self.assertEqual(list(dedup.filter(items(0, 350))), [])
+
+    def test_threshold_to_sqlite(self):
+        dedup = Deduplicator(threshold=10, file_name=self.file('seen.db'),
+                             overflow='sqlite')
+        list(dedup.filter(items(0, 10)))
+        self.assertIsInstance(dedup.seen, set)
+
+        list(dedup.filter(items(10, 20)))
+        self.assertIsInstance(dedup.seen, SQLiteSet)
+        self.assertEqual(len(dedup.seen), 20)
+        self.assertEqual(list(dedup.filter(items(0, 20))), [])
+        dedup.close()
+
+    def test_sqlite_needs_file(self):
+        with self.assertRaises(ValueError):
+            Deduplicator(overflow='sqlite')
+
+    def test_persists_set(self):
+        first = Deduplicator(file_name=self.file('seen'))
+        list(first.filter(items(0, 10)))
+        first.close()
+
+        second = Deduplicator(file_name=self.file('seen'))
+        kept = list(second.filter(items(5, 15)))
+        self.assertEqual([item['id'] for item in kept], list(range(10, 15)))
+
+    def test_persists_bloom(self):
+        first = Deduplicator(threshold=10, capacity=50,
+                             file_name=self.file('seen'))
+        list(first.filter(items(0, 120)))
+        first.close()
+
+        second = Deduplicator(threshold=10, capacity=50,
+                              file_name=self.file('seen'))
+        self.assertEqual(len(second.full), len(first.full))
+        self.assertEqual(list(second.filter(items(0, 120))), [])
+
+    def test_persists_sqlite(self):
+        for stop in (5, 30):
+            dedup = Deduplicator(threshold=10, file_name=self.file('seen.db'),
+                                 overflow='sqlite')
+            list(dedup.filter(items(0, stop)))
+            dedup.close()
+
+        dedup = Deduplicator(threshold=10, file_name=self.file('seen.db'),
+                             overflow='sqlite')
+        self.assertIsInstance(dedup.seen, SQLiteSet)
+        self.assertEqual(list(dedup.filter(items(0, 30))), [])
+        dedup.close()
+
+    def test_missing_ids_are_kept(self):
+        dedup = Deduplicator(file_name=self.file('seen'))
+        listings = [{'kind': 't3', 'data': {'id': str(i)}} for i in range(5)]
+        self.assertEqual(len(list(dedup.filter(listings))), 5)
+        self.assertEqual(dedup.stats()['missing'], 5)
+        dedup.close()
+
+        dedup = Deduplicator(file_name=self.file('seen'))
+        self.assertEqual(len(dedup.seen), 0)
+        self.assertEqual(len(list(dedup.filter(listings))), 5)
+
+    def test_key_path_and_namespace(self):
+        dedup = Deduplicator('data.id', namespace='reddit:')
+        list(dedup.filter(items(0, 3)))
+        self.assertEqual(sorted(dedup.seen),
+                         ['reddit:x0', 'reddit:x1', 'reddit:x2'])
@@ -0,0 +1,61 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from socialreaper.distributed import SQLiteQueue, Worker, publish, task_key
+from socialreaper.iterators import Reddit
+
+
+class FakeReddit(Reddit):
+    def __init__(self):
+        self.calls = []
+
+    def subreddit(self, subreddit, **kwargs):
+        return iter([{'data': {'id': thread, 'subreddit': subreddit}}
+                     for thread in ('t1', 't2', 't1')])
+
+    def thread_comments(self, thread, subreddit, **kwargs):
+        self.calls.append((thread, subreddit, kwargs))
+        return iter([{'data': {'id': '%s_c%s' % (thread, i)}}
+                     for i in range(2)])
+
+
+class TestDistributed(TestCase):
+    def setUp(self):
+        self.queue = SQLiteQueue(
+            os.path.join(tempfile.mkdtemp(), 'queue.db'))
+
+    def test_publish_and_run(self):
+        crawl = FakeReddit().subreddit_thread_comments('python', count=5)
+        self.assertEqual(publish(crawl, self.queue), 2)
+
+        source = FakeReddit()
+        items = []
+        worker = Worker(self.queue, source, [items])
+        self.assertEqual(worker.run(), 2)
+
+        self.assertEqual(self.queue.counts(), {'done': 2})
+        self.assertEqual(sorted(source.calls),
+                         [('t1', 'python', {'count': 5}),
+                          ('t2', 'python', {'count': 5})])
+        self.assertEqual(len(items), 4)
+
+    def test_arguments_make_new_tasks(self):
+        publish(FakeReddit().subreddit_thread_comments('python'), self.queue)
+        self.assertEqual(publish(FakeReddit().subreddit_thread_comments(
+            'python'), self.queue), 0)
+        self.assertEqual(publish(FakeReddit().subreddit_thread_comments(
+            'python', count=10), self.queue), 2)
+
+        self.assertNotEqual(task_key('m', 'k', {'count': 5}),
+                            task_key('m', 'k', {'count': 10}))
+
+    def test_expired_lease(self):
+        self.queue.put('k', {'method': 'thread_comments',
+                             'args': ['t9'], 'kwargs': {'subreddit': 'x'}})
+        self.assertIsNotNone(self.queue.claim('stopped-worker', -1))
+
+        items = []
+        Worker(self.queue, FakeReddit(), [items]).run()
+        self.assertEqual(len(items), 2)
+        self.assertEqual(self.queue.counts(), {'done': 1})
@@ -468,6 +468,23 @@ class TestReddit(Generator):
         self.check_dict_keys(comments_data, ["author", "name", "score",
                                              "body"])
 
+    def test_info(self):
+        threads = self.rdt.subreddit("videos", count=150)
+        names = [thread["data"]["name"] for thread in threads]
+
+        info = self.rdt.info(name for name in names)
+        info = list(info)
+
+        self.assertEqual([thread["data"]["name"] for thread in info], names)
+
+    def test_thread_comments_more(self):
+        iterator = self.rdt.thread_comments("z1c9z", "IamA")
+        comments = list(iterator)
+
+        ids = [comment["data"]["id"] for comment in comments]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertLess(iterator.get_request_count(), len(comments))
+
 
 class TestYoutube(Generator):
     def setUp(self):
@@ -488,6 +505,14 @@ class TestYoutube(Generator):
         self.check_list(videos)
         self.check_dict_keys(videos, ["etag", "id", "kind", "snippet"])
 
+    def test_videos(self):
+        videos = self.ytb.search("music", count=60)
+        videos = list(self.ytb.videos(videos, key='id.videoId'))
+
+        self.assertEqual(len(videos), 60)
+        for video in videos:
+            self.assertIn("statistics", video["video"])
+
     def test_video_comments(self):
         pass
 
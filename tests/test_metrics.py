@@ -0,0 +1,73 @@
+from unittest import TestCase
+
+from socialreaper import apis, codec
+from socialreaper.metrics import Metrics
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, body):
+        self.content = codec.dumps(body).encode('utf-8')
+
+    def raise_for_status(self):
+        pass
+
+
+class Session:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        return Response({'data': [], 'response': {'posts': []}})
+
+
+def recorded(api):
+    api.session = Session()
+    api.request_rate = 0
+    api.metrics = Metrics()
+    return api
+
+
+class TestMetrics(TestCase):
+    def test_counts(self):
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(lambda event, details: events.append(event))
+
+        metrics.request('Reddit', 'api/info', 0.5, status=200, size=10)
+        metrics.request('Reddit', 'api/info', 0.25, status=503, retry=1,
+                        error=ValueError("busy"))
+        metrics.wait('rate_limit', 2)
+        metrics.page('SearchIter', 25, 1)
+
+        snapshot = metrics.snapshot()
+        endpoint = snapshot['endpoints'][0]
+        self.assertEqual((endpoint['requests'], endpoint['errors'],
+                          endpoint['retries'], endpoint['bytes']),
+                         (2, 1, 1, 10))
+        self.assertEqual(endpoint['statuses'], {'200': 1, '503': 1})
+        self.assertEqual(snapshot['waits'], {'rate_limit': 2})
+        self.assertEqual(events, ['request', 'request', 'wait', 'page'])
+
+        text = metrics.to_prometheus()
+        self.assertIn('socialreaper_requests_total{api="Reddit",'
+                      'endpoint="api/info"} 2', text)
+
+    def test_routes_leave_out_ids(self):
+        facebook = recorded(apis.Facebook('key'))
+        for post_id in ('1_2', '1_3', '1_4'):
+            facebook.post_comments(post_id)
+
+        tumblr = recorded(apis.Tumblr('key'))
+        for blog in ('a', 'b'):
+            tumblr.blog_posts(blog)
+
+        self.assertEqual(
+            [e['endpoint'] for e in facebook.metrics.snapshot()['endpoints']],
+            ['{post}/comments'])
+        self.assertEqual(
+            [e['requests'] for e in tumblr.metrics.snapshot()['endpoints']],
+            [2])
+        self.assertEqual(len(facebook.session.urls), 3)
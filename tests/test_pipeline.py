@@ -0,0 +1,100 @@
+import csv
+import os
+import sqlite3
+import tempfile
+import threading
+import warnings
+from unittest import TestCase
+
+from socialreaper import codec
+from socialreaper.pipeline import CSVSink, JSONLSink, Pipeline, SQLiteSink
+
+
+class TestSinks(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def file(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_csv_flattens(self):
+        sink = CSVSink(self.file('data.csv'))
+        sink.write_batch([{'id': 1, 'user': {'name': 'a'}}])
+        sink.close()
+
+        with open(self.file('data.csv'), encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows, [{'id': '1', 'user.name': 'a'}])
+
+    def test_csv_warns_of_new_keys(self):
+        sink = CSVSink(self.file('data.csv'))
+        sink.write({'id': 1})
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            sink.write({'id': 2, 'title': 'b'})
+            sink.write({'id': 3, 'title': 'c'})
+        sink.close()
+
+        self.assertEqual(len(caught), 1)
+        self.assertIn('title', str(caught[0].message))
+
+    def test_jsonl(self):
+        sink = JSONLSink(self.file('data.jsonl'))
+        sink.write_batch([{'id': 1}, {'id': 2}])
+        sink.close()
+
+        with open(self.file('data.jsonl'), encoding='utf-8') as f:
+            self.assertEqual([codec.loads(line) for line in f],
+                             [{'id': 1}, {'id': 2}])
+
+    def test_sqlite_from_threads(self):
+        sink = SQLiteSink(self.file('data.db'), key='id')
+        sink.write({'id': 1})
+
+        errors = []
+
+        def write():
+            try:
+                sink.write({'id': 2})
+                sink.write({'id': 1, 'again': True})
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        sink.close()
+
+        self.assertEqual(errors, [])
+        rows = sqlite3.connect(self.file('data.db')).execute(
+            'SELECT id, data FROM items ORDER BY id').fetchall()
+        self.assertEqual([(key, codec.loads(data)) for key, data in rows],
+                         [('1', {'id': 1, 'again': True}), ('2', {'id': 2})])
+
+
+class TestPipeline(TestCase):
+    def test_stages(self):
+        items = [{'id': i % 7, 'data': {'n': i}} for i in range(50)]
+        output = []
+
+        stats = Pipeline(iter(items), batch_size=8) \
+            .dedup('id') \
+            .filter(lambda item: item['id'] % 2 == 0) \
+            .project('id', 'data.n') \
+            .to(output).run()
+
+        self.assertEqual(output, [{'id': 0, 'data.n': 0},
+                                  {'id': 2, 'data.n': 2},
+                                  {'id': 4, 'data.n': 4},
+                                  {'id': 6, 'data.n': 6}])
+        self.assertEqual([stage['stage'] for stage in stats],
+                         ['source', 'dedup', 'filter', 'project', 'sinks'])
+        self.assertEqual(stats[0]['items_out'], 50)
+
+    def test_error_is_raised(self):
+        def source():
+            yield {'id': 1}
+            raise ValueError("broken")
+
+        with self.assertRaises(ValueError):
+            Pipeline(source()).to([]).run()
@@ -0,0 +1,95 @@
+from unittest import TestCase
+
+from socialreaper import codec
+from socialreaper.apis import API
+from socialreaper.exceptions import ApiError, NoCredentialsError, \
+    QuotaExceededError
+from socialreaper.pool import CredentialPool, PooledApi
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.content = codec.dumps(body if body else {}).encode('utf-8')
+
+
+class Refused(Exception):
+    def __init__(self, status_code, body=None):
+        self.response = Response(status_code, body)
+
+
+class FakeApi(API):
+    def __init__(self, key, fail=None):
+        super().__init__()
+        self.key = key
+        self.fail = fail
+
+    def video_comments(self, video_id):
+        if self.fail:
+            raise self.fail
+        return {'key': self.key, 'video': video_id}
+
+
+class TestCredentialPool(TestCase):
+    def pool(self, *fails):
+        return CredentialPool([FakeApi(str(i), fail)
+                               for i, fail in enumerate(fails)])
+
+    def test_round_robin(self):
+        api = PooledApi(self.pool(None, None))
+        keys = [api.video_comments('v')['key'] for _ in range(4)]
+        self.assertEqual(keys, ['0', '1', '0', '1'])
+
+    def test_refused_key_is_quarantined(self):
+        pool = self.pool(ApiError(Refused(401)), None)
+        api = PooledApi(pool)
+
+        self.assertEqual(api.video_comments('v')['key'], '1')
+        self.assertEqual(api.video_comments('v')['key'], '1')
+        self.assertEqual([key['healthy'] for key in pool.health()],
+                         [False, True])
+
+    def test_quota_reason_is_quarantined(self):
+        body = {'error': {'code': 403,
+                          'errors': [{'reason': 'quotaExceeded'}]}}
+        pool = self.pool(ApiError(Refused(403, body)), None)
+
+        self.assertEqual(PooledApi(pool).video_comments('v')['key'], '1')
+        self.assertFalse(pool.health()[0]['healthy'])
+
+    def test_forbidden_request_keeps_keys(self):
+        body = {'error': {'code': 403,
+                          'errors': [{'reason': 'commentsDisabled'}]}}
+        error = ApiError(Refused(403, body))
+        pool = self.pool(error, error, error)
+
+        with self.assertRaises(ApiError):
+            PooledApi(pool).video_comments('v')
+        self.assertTrue(all(key['healthy'] for key in pool.health()))
+
+    def test_all_quarantined(self):
+        pool = self.pool(QuotaExceededError("spent"))
+
+        with self.assertRaises(NoCredentialsError):
+            PooledApi(pool).video_comments('v')
+
+    def test_control_methods_reach_every_key(self):
+        pool = self.pool(None, None, None)
+        api = PooledApi(pool)
+
+        api.stop()
+        self.assertTrue(all(a.waiter.stopped.is_set() for a in pool.apis))
+        api.resume()
+        self.assertFalse(any(a.waiter.stopped.is_set() for a in pool.apis))
+        self.assertEqual([key['requests'] for key in pool.health()],
+                         [0, 0, 0])
+
+    def test_attributes_reach_every_key(self):
+        pool = self.pool(None, None)
+        api = PooledApi(pool)
+
+        api.request_rate = 2
+        api.endpoint_rates['comments'] = 0.5
+        self.assertEqual([a.request_rate for a in pool.apis], [2, 2])
+        self.assertEqual([a.endpoint_rates for a in pool.apis],
+                         [{'comments': 0.5}] * 2)
@@ -0,0 +1,27 @@
+import threading
+from unittest import TestCase
+
+from socialreaper.profiler import Profiler
+
+
+class TestProfiler(TestCase):
+    def test_seconds_are_measured(self):
+        stopped = threading.Event()
+        threads = [threading.Thread(target=stopped.wait) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+
+        profiler = Profiler()
+        profiler.started = 0
+        try:
+            # A slow sample covers more time than the interval
+            profiler.sample(0.5)
+            profiler.sample(0.25)
+        finally:
+            stopped.set()
+            for thread in threads:
+                thread.join()
+        profiler.finished = 0.75
+
+        idle = profiler.summary()['phases']['idle']
+        self.assertAlmostEqual(idle['seconds'], 0.75 * 3)
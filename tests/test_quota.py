@@ -0,0 +1,95 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from unittest import TestCase, mock
+
+from socialreaper import YouTube, codec, quota
+from socialreaper.exceptions import QuotaExceededError
+from socialreaper.quota import QuotaLedger, QuotaScheduler, shared_ledger
+
+
+class Response:
+    def __init__(self, body):
+        self.content = codec.dumps(body).encode('utf-8')
+
+
+def comment_pages(pages):
+    def get(url, params=None, **kwargs):
+        page = int(params.get('pageToken') or 0)
+        body = {'items': [{'id': '%s_%s' % (page, i), 'snippet': {}}
+                          for i in range(3)]}
+        if page + 1 < pages:
+            body['nextPageToken'] = str(page + 1)
+        return Response(body)
+
+    return get
+
+
+class TestQuotaLedger(TestCase):
+    def test_limit(self):
+        ledger = QuotaLedger(limit=150)
+        ledger.spend(100, 'search')
+        self.assertEqual(ledger.remaining(), 50)
+        self.assertFalse(ledger.can_spend(100))
+        with self.assertRaises(QuotaExceededError):
+            ledger.spend(100, 'search')
+
+    def test_no_limit(self):
+        ledger = QuotaLedger(limit=None)
+        for _ in range(200):
+            ledger.spend(100, 'search')
+        self.assertEqual(ledger.spent, 20000)
+        self.assertTrue(ledger.can_spend(100))
+
+    def test_file(self):
+        file_name = os.path.join(tempfile.mkdtemp(), 'quota.json')
+        QuotaLedger(file_name=file_name).spend(30)
+        self.assertEqual(QuotaLedger(file_name=file_name).spent, 30)
+
+    def test_shared_by_key(self):
+        self.assertIs(shared_ledger('a'), shared_ledger('a'))
+        self.assertIsNot(shared_ledger('a'), shared_ledger('b'))
+
+    def test_pacific_date_without_zoneinfo(self):
+        class Clock(datetime):
+            @classmethod
+            def utcnow(cls):
+                return cls.now_utc
+
+        cases = [(datetime(2026, 7, 1, 6, 30), '2026-06-30'),
+                 (datetime(2026, 7, 1, 7, 30), '2026-07-01'),
+                 (datetime(2026, 1, 1, 7, 30), '2025-12-31'),
+                 (datetime(2026, 1, 1, 8, 30), '2026-01-01')]
+
+        with mock.patch.object(quota, 'datetime', Clock), \
+                mock.patch.object(quota, 'PACIFIC', None):
+            for now, date in cases:
+                Clock.now_utc = now
+                self.assertEqual(quota.pacific_date(), date)
+
+        if quota.PACIFIC:
+            for now, date in cases:
+                self.assertEqual(now.replace(tzinfo=timezone.utc).astimezone(
+                    quota.PACIFIC).strftime('%Y-%m-%d'), date)
+
+
+class TestQuotaScheduler(TestCase):
+    def test_deferred_comments_resume(self):
+        ledger = QuotaLedger(limit=2)
+        youtube = YouTube('key', ledger)
+        youtube.api.request_rate = 0
+        youtube.api.get = comment_pages(3)
+
+        scheduler = QuotaScheduler(youtube)
+        scheduler.add('video_comments', 'video')
+
+        first = [item['id'] for item in scheduler]
+        self.assertEqual(first, ['0_0', '0_1', '0_2', '1_0', '1_1', '1_2'])
+        self.assertEqual(len(scheduler.deferred), 1)
+
+        # The next day's quota
+        ledger.spent = 0
+        scheduler.resume()
+        rest = [item['id'] for item in scheduler]
+        self.assertEqual(rest, ['2_0', '2_1', '2_2'])
+        self.assertEqual(scheduler.deferred, [])
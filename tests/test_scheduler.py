@@ -0,0 +1,92 @@
+import threading
+from time import sleep
+from unittest import TestCase
+
+from socialreaper import apis
+from socialreaper.scheduler import Scheduler
+
+
+class Source:
+    def __init__(self, api=None):
+        self.api = api
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def items(self, name, count=3):
+        with self.lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            for i in range(count):
+                sleep(0.01)
+                yield {'job': name, 'i': i}
+        finally:
+            with self.lock:
+                self.running -= 1
+
+    def broken(self):
+        yield {'i': 0}
+        raise ValueError("broken")
+
+    def waiting(self):
+        while True:
+            self.api._rate_limit()
+            yield {}
+
+
+class TestScheduler(TestCase):
+    def test_runs_jobs_into_sinks(self):
+        items = []
+        scheduler = Scheduler(workers=3, sinks=[items])
+        source = Source()
+        for name in 'abcd':
+            scheduler.add(source, 'items', name)
+        failed = scheduler.add(source, 'broken')
+
+        jobs = scheduler.run()
+
+        self.assertEqual(len(items), 13)
+        self.assertEqual([job.status for job in jobs],
+                         ['done'] * 4 + ['failed'])
+        self.assertIsInstance(failed.error, ValueError)
+
+    def test_platform_limit(self):
+        source = Source()
+        scheduler = Scheduler(workers=4, limits={'Source': 2})
+        for name in 'abcdef':
+            scheduler.add(source, 'items', name)
+        scheduler.run()
+
+        self.assertEqual(source.most_running, 2)
+
+    def test_priority(self):
+        items = []
+        scheduler = Scheduler(workers=1, sinks=[items])
+        source = Source()
+        scheduler.add(source, 'items', 'low', count=1)
+        scheduler.add(source, 'items', 'high', count=1, priority=1)
+        scheduler.run()
+
+        self.assertEqual([item['job'] for item in items], ['high', 'low'])
+
+    def test_stop_cuts_waits_and_resumes_api(self):
+        api = apis.Tumblr('key')
+        api.request_rate = 30
+        source = Source(api)
+
+        scheduler = Scheduler(workers=1)
+        job = scheduler.add(source, 'waiting')
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        sleep(0.2)
+        scheduler.stop()
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(job.status, 'stopped')
+        self.assertFalse(api.waiter.stopped.is_set())
+
+        other = apis.Tumblr('key')
+        other.request_rate = 0
+        other._rate_limit()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+from time import sleep, time
+from unittest import TestCase, mock
+
+from socialreaper import apis, codec
+from socialreaper.tokens import FileTokenStore, TokenStore
+
+
+class Response:
+    def __init__(self, body):
+        self.content = codec.dumps(body).encode('utf-8')
+
+
+class TestTokenStore(TestCase):
+    def test_get_set_discard(self):
+        store = TokenStore()
+        self.assertIsNone(store.get('app'))
+        store.set('app', 'token', 100)
+        self.assertEqual(store.get('app'), ('token', 100))
+        store.discard('app')
+        self.assertIsNone(store.get('app'))
+
+    def test_file_store_is_shared(self):
+        file_name = os.path.join(tempfile.mkdtemp(), 'tokens.json')
+        FileTokenStore(file_name).set('app', 'token', 100)
+        self.assertEqual(FileTokenStore(file_name).get('app'),
+                         ('token', 100))
+
+    def test_abandoned_lock_is_taken(self):
+        file_name = os.path.join(tempfile.mkdtemp(), 'tokens.json')
+        store = FileTokenStore(file_name, lock_timeout=0)
+        open(store.lock_name, 'w').close()
+
+        with store.lock('app'):
+            pass
+        self.assertFalse(os.path.exists(store.lock_name))
+
+
+class TestRedditTokens(TestCase):
+    def test_single_refresh(self):
+        store = TokenStore()
+        requests_made = []
+
+        def post(*args, **kwargs):
+            requests_made.append(1)
+            sleep(0.1)
+            return Response({'access_token': 'token%s' % len(requests_made),
+                             'expires_in': 3600})
+
+        reddits = [apis.Reddit('app', 'secret', store) for _ in range(5)]
+        with mock.patch('requests.post', post):
+            threads = [threading.Thread(target=reddit.refresh_token)
+                       for reddit in reddits]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(requests_made), 1)
+        self.assertEqual({reddit.token for reddit in reddits}, {'token1'})
+
+    def test_rejected_token_is_replaced(self):
+        store = TokenStore()
+        store.set('app', 'old', time() + 3600)
+        reddit = apis.Reddit('app', 'secret', store)
+
+        with mock.patch('requests.post', lambda *args, **kwargs: Response(
+                {'access_token': 'new', 'expires_in': 3600})):
+            reddit.refresh_token()
+            self.assertEqual(reddit.token, 'old')
+            reddit.refresh_token(rejected='old')
+
+        self.assertEqual(reddit.token, 'new')
+        self.assertEqual(store.get('app')[0], 'new')